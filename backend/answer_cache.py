@@ -0,0 +1,146 @@
+"""
+Semantic answer cache for the RAG chatbot.
+
+Answers are stored under their question embedding, partitioned by a
+namespace (user-profile tier plus selected text). A later question in the
+same namespace whose embedding is within the cosine threshold gets the
+stored answer and sources back without a Qdrant query or LLM completion.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class _Namespace:
+    """Entries sharing a namespace, with their embeddings as rows of one matrix."""
+    
+    def __init__(self, dimension: int):
+        self.ids: List[int] = []
+        # entry id -> its row; rows past len(ids) are spare capacity
+        self.rows: Dict[int, int] = {}
+        self.matrix = np.empty((8, dimension), dtype=np.float32)
+    
+    def add(self, entry_id: int, vector: np.ndarray):
+        if len(self.ids) == len(self.matrix):
+            grown = np.empty((2 * len(self.matrix), self.matrix.shape[1]), dtype=np.float32)
+            grown[:len(self.ids)] = self.matrix
+            self.matrix = grown
+        self.rows[entry_id] = len(self.ids)
+        self.matrix[len(self.ids)] = vector
+        self.ids.append(entry_id)
+    
+    def remove(self, entry_id: int):
+        """Drop an entry's row by moving the last row into its place."""
+        row = self.rows.pop(entry_id)
+        last_id = self.ids.pop()
+        if last_id != entry_id:
+            self.matrix[row] = self.matrix[len(self.ids)]
+            self.ids[row] = last_id
+            self.rows[last_id] = row
+    
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        return self.matrix[:len(self.ids)] @ query
+
+
+class SemanticAnswerCache:
+    """TTL + LRU bounded cache of answers keyed by question embedding."""
+    
+    def __init__(self, threshold: float, ttl_seconds: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._ids = count()
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def check_version(self, version):
+        """Drop every entry if the underlying collection has changed."""
+        with self._lock:
+            if self.version != version:
+                if self.version is not None:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._namespaces.clear()
+                self.version = version
+    
+    def lookup(self, embedding: List[float], namespace: str) -> Optional[Dict]:
+        """Return the cached result for the closest question, if close enough."""
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._namespaces.get(namespace)
+            if bucket is None or not bucket.ids:
+                self.misses += 1
+                return None
+            scores = bucket.scores(query)
+            best = int(np.argmax(scores))
+            entry_id = bucket.ids[best]
+            entry = self._entries[entry_id]
+            if entry["expires_at"] <= now:
+                self._remove(entry_id)
+                self.misses += 1
+                return None
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return entry["result"]
+    
+    def store(self, embedding: List[float], namespace: str, result: Dict):
+        """Cache a result, evicting the least recently used entries past capacity."""
+        with self._lock:
+            entry_id = next(self._ids)
+            vector = self._normalize(embedding)
+            self._entries[entry_id] = {
+                "namespace": namespace,
+                "result": result,
+                "expires_at": time.monotonic() + self.ttl_seconds
+            }
+            bucket = self._namespaces.get(namespace)
+            if bucket is None:
+                bucket = self._namespaces[namespace] = _Namespace(len(vector))
+            bucket.add(entry_id, vector)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        bucket = self._namespaces[entry["namespace"]]
+        bucket.remove(entry_id)
+        if not bucket.ids:
+            del self._namespaces[entry["namespace"]]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._namespaces.clear()
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
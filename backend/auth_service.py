@@ -1,32 +1,40 @@
 from datetime import datetime, timedelta
 from typing import Optional
-import bcrypt
 import jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import User
 from config import settings
+from password_hashing import password_hasher
 
 
 class AuthService:
     """Service for authentication operations."""
     
     @staticmethod
-    def hash_password(password: str) -> str:
-        """Hash a password using bcrypt."""
-        salt = bcrypt.gensalt()
-        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    async def hash_password(password: str) -> str:
+        """Hash a password using bcrypt, off the event loop."""
+        return await password_hasher.hash(password)
     
     @staticmethod
-    def verify_password(password: str, hashed: str) -> bool:
-        """Verify a password against its hash."""
-        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    async def verify_password(password: str, hashed: str) -> bool:
+        """Verify a password against its hash, off the event loop."""
+        return await password_hasher.verify(password, hashed)
     
     @staticmethod
-    def create_access_token(user_id: int, email: str) -> str:
-        """Create JWT access token."""
+    def create_access_token(user: User) -> str:
+        """
+        Create JWT access token carrying the user's profile. The profile
+        claims are informational; requests are served the stored profile,
+        at least as new as the token's profile_version.
+        """
         payload = {
-            "user_id": user_id,
-            "email": email,
+            "user_id": user.id,
+            "email": user.email,
+            "name": user.name,
+            "software_experience": user.software_experience,
+            "hardware_experience": user.hardware_experience,
+            "profile_version": user.profile_version,
             "exp": datetime.utcnow() + timedelta(days=7)
         }
         return jwt.encode(payload, settings.auth_secret, algorithm="HS256")
@@ -43,8 +51,8 @@ class AuthService:
             return None
     
     @staticmethod
-    def create_user(
-        db: Session,
+    async def create_user(
+        db: AsyncSession,
         email: str,
         name: str,
         password: str,
@@ -52,7 +60,7 @@ class AuthService:
         hardware_experience: str
     ) -> User:
         """Create a new user."""
-        hashed_password = AuthService.hash_password(password)
+        hashed_password = await AuthService.hash_password(password)
         
         user = User(
             email=email,
@@ -63,28 +71,52 @@ class AuthService:
         )
         
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         
         return user
     
     @staticmethod
-    def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+    async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+        """Get user by email."""
+        result = await db.execute(select(User).where(User.email == email))
+        return result.scalars().first()
+    
+    @staticmethod
+    async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
         """Authenticate a user."""
-        user = db.query(User).filter(User.email == email).first()
+        user = await AuthService.get_user_by_email(db, email)
         
         if not user:
             return None
         
-        if not AuthService.verify_password(password, user.password_hash):
+        if not await AuthService.verify_password(password, user.password_hash):
             return None
         
         return user
     
     @staticmethod
-    def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
+    async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
         """Get user by ID."""
-        return db.query(User).filter(User.id == user_id).first()
+        return await db.get(User, user_id)
+    
+    @staticmethod
+    async def update_profile(db: AsyncSession, user_id: int, **fields) -> Optional[User]:
+        """Update a user's profile fields; None values are left unchanged."""
+        user = await db.get(User, user_id)
+        if not user:
+            return None
+        
+        for field, value in fields.items():
+            if value is not None:
+                setattr(user, field, value)
+        # Tokens issued before this update now defer to the stored profile
+        user.profile_version += 1
+        
+        await db.commit()
+        await db.refresh(user)
+        
+        return user
 
 
 auth_service = AuthService()
@@ -0,0 +1,330 @@
+"""
+Load-test the API offline and report throughput and latency as JSON.
+
+Starts benchmarks/fake_openai.py and the API (uvicorn main:app) as
+subprocesses, with Qdrant in memory and SQLite in a temporary directory,
+then drives ingest, chat, streamed chat, signup/login and personalize
+workloads at a fixed concurrency. Each workload reports RPS, p50/p95/p99
+latency, errors and the API process's memory, so runs can be diffed
+across commits.
+
+    python -m benchmarks.api_load --requests 200 --concurrency 20 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TOPICS = [
+    "ROS 2 nodes and topics", "URDF robot descriptions", "Gazebo simulation",
+    "NVIDIA Isaac Sim", "visual SLAM", "bipedal locomotion", "inverse kinematics",
+    "vision-language-action models", "sensor fusion with IMUs", "reinforcement learning for control"
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_memory_mb(pid: int) -> Dict:
+    """Current and peak resident memory of a process, in MB (Linux)."""
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key = "rss_mb" if line.startswith("VmRSS") else "peak_rss_mb"
+                    memory[key] = round(int(line.split()[1]) / 1024, 1)
+    except FileNotFoundError:
+        pass
+    return memory
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def latency_summary(samples: List[float]) -> Dict:
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95)] * 1000, 2),
+        "p99_ms": round(samples[int(len(samples) * 0.99)] * 1000, 2),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+        "max_ms": round(samples[-1] * 1000, 2)
+    }
+
+
+def sample_document(i: int) -> Dict:
+    topic = TOPICS[i % len(TOPICS)]
+    text = " ".join(
+        f"Section {i}.{j} explains {topic} for humanoid robots, covering setup, tuning and common failure modes."
+        for j in range(12)
+    )
+    return {"text": text, "metadata": {"source": f"bench/{i}.md", "chunk_index": 0}}
+
+
+async def wait_until_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with code {process.returncode}")
+        try:
+            await client.get("/")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"{process.args} did not start within {timeout}s")
+
+
+async def run_workload(
+    name: str,
+    request: Callable[[int], Awaitable[Optional[float]]],
+    total: int,
+    concurrency: int,
+    api_pid: int
+) -> Dict:
+    """
+    Issue `total` requests with at most `concurrency` in flight. request(i)
+    returns the time to first token for streamed workloads, else None, and
+    raises on failure.
+    """
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    errors: Dict[str, int] = {}
+    next_index = 0
+    
+    async def worker():
+        nonlocal next_index
+        while next_index < total:
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                first_token = await request(i)
+            except Exception as e:
+                key = type(e).__name__ if not isinstance(e, httpx.HTTPStatusError) else str(e.response.status_code)
+                errors[key] = errors.get(key, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if first_token is not None:
+                first_tokens.append(first_token - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    result = {
+        "requests": total,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency": latency_summary(latencies),
+        "memory": process_memory_mb(api_pid)
+    }
+    if first_tokens:
+        result["first_token"] = latency_summary(first_tokens)
+    print(f"{name}: {result['ok']}/{total} ok, {result['rps']} rps, p50 {result['latency'].get('p50_ms')} ms, "
+          f"p99 {result['latency'].get('p99_ms')} ms", file=sys.stderr)
+    return result
+
+
+async def run(args) -> Dict:
+    workdir = tempfile.mkdtemp(prefix="api-load-")
+    openai_port = free_port()
+    api_port = free_port()
+    
+    fake_openai = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.fake_openai",
+            "--port", str(openai_port),
+            "--latency-ms", str(args.llm_latency_ms),
+            "--tokens-per-second", str(args.tokens_per_second),
+            "--completion-tokens", str(args.completion_tokens),
+            "--embedding-latency-ms", str(args.embedding_latency_ms)
+        ],
+        cwd=BACKEND_DIR
+    )
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "QDRANT_URL": ":memory:",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'benchmark.sqlite3')}",
+        "AUTH_SECRET": "benchmark",
+        "EMBEDDING_BACKEND": "openai",
+        "EMBEDDING_CACHE_BACKEND": "memory",
+        "LOCAL_INDEX_ENABLED": "false",
+        "RERANK_ENABLED": "false",
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds)
+    }
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(api_port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+    
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    results: Dict[str, Dict] = {}
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{api_port}", timeout=120, limits=limits
+        ) as client:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{openai_port}") as probe:
+                await wait_until_ready(probe, fake_openai)
+            await wait_until_ready(client, api)
+            results["startup"] = {"memory": process_memory_mb(api.pid)}
+            workloads = set(args.workloads.split(","))
+            
+            if "ingest" in workloads:
+                batch = args.ingest_batch
+                
+                async def ingest(i: int):
+                    documents = [sample_document(i * batch + j) for j in range(batch)]
+                    response = await client.post("/api/admin/ingest", json={"documents": documents})
+                    response.raise_for_status()
+                
+                results["ingest"] = await run_workload(
+                    "ingest", ingest, args.ingest_requests, min(args.concurrency, 4), api.pid
+                )
+                results["ingest"]["documents_per_request"] = batch
+            
+            if "chat" in workloads:
+                async def chat(i: int):
+                    question = f"How do I get started with {TOPICS[i % len(TOPICS)]}? ({i % args.distinct_questions})"
+                    response = await client.post("/api/chat", json={"question": question})
+                    response.raise_for_status()
+                
+                results["chat"] = await run_workload("chat", chat, args.requests, args.concurrency, api.pid)
+            
+            if "chat_stream" in workloads:
+                async def chat_stream(i: int) -> Optional[float]:
+                    question = f"Explain {TOPICS[i % len(TOPICS)]} step by step ({i})"
+                    first_token = None
+                    async with client.stream("POST", "/api/chat/stream", json={"question": question}) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if first_token is None and line == "event: token":
+                                first_token = time.perf_counter()
+                    return first_token
+                
+                results["chat_stream"] = await run_workload(
+                    "chat_stream", chat_stream, args.requests, args.concurrency, api.pid
+                )
+            
+            tokens: List[str] = []
+            if workloads & {"login", "personalize"}:
+                async def signup(i: int):
+                    response = await client.post("/api/auth/signup", json={
+                        "email": f"bench{i}@example.com",
+                        "name": f"Bench {i}",
+                        "password": "benchmark-password",
+                        "software_experience": ["beginner", "intermediate", "advanced"][i % 3],
+                        "hardware_experience": ["beginner", "intermediate", "advanced"][(i // 3) % 3]
+                    })
+                    response.raise_for_status()
+                    tokens.append(response.json()["token"])
+                
+                results["signup"] = await run_workload(
+                    "signup", signup, args.users, min(args.concurrency, args.users), api.pid
+                )
+            
+            if "login" in workloads:
+                async def login(i: int):
+                    response = await client.post("/api/auth/login", json={
+                        "email": f"bench{i % args.users}@example.com",
+                        "password": "benchmark-password"
+                    })
+                    response.raise_for_status()
+                
+                results["login"] = await run_workload("login", login, args.logins, args.concurrency, api.pid)
+            
+            if "personalize" in workloads and tokens:
+                async def personalize(i: int):
+                    page = i % args.pages
+                    response = await client.post(
+                        "/api/personalize",
+                        json={"content": sample_document(page)["text"], "page_path": f"/docs/bench/{page}"},
+                        headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+                    )
+                    response.raise_for_status()
+                
+                results["personalize"] = await run_workload(
+                    "personalize", personalize, args.requests, args.concurrency, api.pid
+                )
+            
+            results["final"] = {"memory": process_memory_mb(api.pid)}
+    finally:
+        for process in (api, fake_openai):
+            process.terminate()
+        for process in (api, fake_openai):
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "workloads": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", default="ingest,chat,chat_stream,login,personalize")
+    parser.add_argument("--requests", type=int, default=200, help="requests per chat/personalize workload")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--distinct-questions", type=int, default=50, help="chat questions before they repeat")
+    parser.add_argument("--ingest-requests", type=int, default=10)
+    parser.add_argument("--ingest-batch", type=int, default=50, help="documents per ingest request")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=10, help="distinct pages personalized")
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--completion-tokens", type=int, default=100)
+    parser.add_argument("--embedding-latency-ms", type=float, default=20)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+    
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
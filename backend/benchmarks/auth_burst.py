@@ -0,0 +1,130 @@
+"""
+Benchmark chat latency during a burst of logins.
+
+Fires a burst of concurrent password checks while a probe keeps issuing
+simulated chat requests (an awaited upstream call of --chat-ms), and
+reports probe latency before and during the burst. "inline" runs bcrypt
+on the event loop as the login handler used to; "pool" goes through the
+bounded PasswordHasher.
+
+    python -m benchmarks.auth_burst --logins 500 --rounds 10 --json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Dict, List
+
+import bcrypt
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("QDRANT_URL", ":memory:")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("AUTH_SECRET", "benchmark")
+
+from config import settings  # noqa: E402
+from password_hashing import HashingPoolBusy, PasswordHasher  # noqa: E402
+
+PASSWORD = "correct horse battery staple"
+
+
+def latency_summary(samples: List[float]) -> Dict:
+    samples = sorted(samples)
+    return {
+        "requests": len(samples),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+        "p95_ms": round(samples[int(len(samples) * 0.95)] * 1000, 1),
+        "p99_ms": round(samples[int(len(samples) * 0.99)] * 1000, 1),
+        "max_ms": round(samples[-1] * 1000, 1),
+        "mean_ms": round(statistics.mean(samples) * 1000, 1)
+    }
+
+
+async def probe(stop: asyncio.Event, chat_ms: float, interval_ms: float, samples: List[float]):
+    """Issue one simulated chat request every interval_ms until stopped."""
+    async def chat():
+        started = time.perf_counter()
+        await asyncio.sleep(chat_ms / 1000)
+        samples.append(time.perf_counter() - started)
+    
+    tasks = []
+    while not stop.is_set():
+        tasks.append(asyncio.create_task(chat()))
+        await asyncio.sleep(interval_ms / 1000)
+    await asyncio.gather(*tasks)
+
+
+async def run(mode: str, args, hashed: str) -> Dict:
+    hasher = PasswordHasher(workers=args.workers, max_pending=args.max_pending, rounds=args.rounds)
+    
+    async def login() -> str:
+        if mode == "inline":
+            bcrypt.checkpw(PASSWORD.encode("utf-8"), hashed.encode("utf-8"))
+            return "ok"
+        try:
+            await hasher.verify(PASSWORD, hashed)
+            return "ok"
+        except HashingPoolBusy:
+            return "rejected"
+    
+    baseline: List[float] = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop, args.chat_ms, args.interval_ms, baseline))
+    await asyncio.sleep(args.baseline_seconds)
+    stop.set()
+    await probe_task
+    
+    during: List[float] = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop, args.chat_ms, args.interval_ms, during))
+    await asyncio.sleep(args.interval_ms / 1000)
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(login() for _ in range(args.logins)))
+    burst_seconds = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    
+    return {
+        "mode": mode,
+        "logins_ok": outcomes.count("ok"),
+        "logins_rejected": outcomes.count("rejected"),
+        "burst_seconds": round(burst_seconds, 2),
+        "chat_baseline": latency_summary(baseline),
+        "chat_during_burst": latency_summary(during)
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=settings.bcrypt_rounds, help="bcrypt cost factor")
+    parser.add_argument("--workers", type=int, default=settings.bcrypt_workers)
+    parser.add_argument("--max-pending", type=int, default=settings.bcrypt_max_pending)
+    parser.add_argument("--chat-ms", type=float, default=50, help="simulated upstream time per chat request")
+    parser.add_argument("--interval-ms", type=float, default=20, help="time between probe chat requests")
+    parser.add_argument("--baseline-seconds", type=float, default=1.0)
+    parser.add_argument("--modes", default="inline,pool")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=args.rounds)).decode("utf-8")
+    results = [await run(mode, args, hashed) for mode in args.modes.split(",")]
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(f"{result['mode']}: {result['logins_ok']} ok, {result['logins_rejected']} rejected in {result['burst_seconds']}s")
+        for phase in ("chat_baseline", "chat_during_burst"):
+            summary = result[phase]
+            print(
+                f"  {phase}: p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, "
+                f"p99 {summary['p99_ms']} ms, max {summary['max_ms']} ms ({summary['requests']} requests)"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
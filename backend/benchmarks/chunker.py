@@ -0,0 +1,121 @@
+"""
+Benchmark the structural chunker against the original character chunker.
+
+Reports chunk count, token utilization (mean chunk tokens / budget), token
+size spread, code fences split across chunks, and chunking throughput over
+the docs/ tree (optionally repeated to simulate a larger corpus).
+
+    python -m benchmarks.chunker --repeat 50 --json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("QDRANT_URL", ":memory:")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("AUTH_SECRET", "benchmark")
+
+from chunker import chunk_markdown  # noqa: E402
+from config import settings  # noqa: E402
+from document_loader import FRONTMATTER_RE, discover_files, strip_mdx  # noqa: E402
+from tokens import count_tokens  # noqa: E402
+
+
+def legacy_chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+    """The original character-based chunk_text, kept as the baseline."""
+    chunks = []
+    start = 0
+    
+    while start < len(text):
+        end = start + chunk_size
+        chunk = text[start:end]
+        
+        # Try to end at a sentence boundary
+        if end < len(text):
+            last_period = chunk.rfind('.')
+            last_newline = chunk.rfind('\n\n')
+            boundary = max(last_period, last_newline)
+            
+            if boundary > chunk_size // 2:
+                chunk = chunk[:boundary + 1]
+                end = start + boundary + 1
+        
+        chunks.append(chunk.strip())
+        start = end - overlap
+    
+    return chunks
+
+
+def load_pages(docs_dir: str) -> List[str]:
+    pages = []
+    for path in discover_files(docs_dir):
+        with open(path, 'r', encoding='utf-8') as f:
+            body = FRONTMATTER_RE.sub('', f.read(), count=1)
+        pages.append(strip_mdx(body) if str(path).endswith('.mdx') else body)
+    return pages
+
+
+def summarize(name: str, chunk_lists: List[List[str]], seconds: float, total_chars: int, budget: int) -> Dict:
+    chunks = [chunk for chunk_list in chunk_lists for chunk in chunk_list]
+    sizes = [count_tokens(chunk) for chunk in chunks]
+    return {
+        "chunker": name,
+        "chunks": len(chunks),
+        "tokens_total": sum(sizes),
+        "tokens_mean": round(statistics.mean(sizes), 1),
+        "tokens_stdev": round(statistics.pstdev(sizes), 1),
+        "tokens_max": max(sizes),
+        "utilization": round(statistics.mean(sizes) / budget, 3),
+        "split_code_fences": sum(1 for chunk in chunks if chunk.count('```') % 2),
+        "seconds": round(seconds, 4),
+        "mb_per_second": round(total_chars / seconds / 1e6, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs-dir', default='../docs')
+    parser.add_argument('--repeat', type=int, default=20, help="concatenate each page N times")
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+    
+    pages = ['\n\n'.join([page] * args.repeat) for page in load_pages(args.docs_dir)]
+    total_chars = sum(len(page) for page in pages)
+    # Warm the tokenizer so its one-off load is not timed
+    count_tokens("warm up")
+    
+    started = time.perf_counter()
+    legacy = [[chunk for chunk in legacy_chunk_text(page) if chunk] for page in pages]
+    legacy_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    structural = [
+        [chunk['text'] for chunk in chunk_markdown(page, settings.chunk_max_tokens, settings.chunk_min_tokens)]
+        for page in pages
+    ]
+    structural_seconds = time.perf_counter() - started
+    
+    # The legacy chunker targets 1000 characters, roughly 250 tokens
+    results = [
+        summarize("chunk_text", legacy, legacy_seconds, total_chars, 250),
+        summarize("chunk_markdown", structural, structural_seconds, total_chars, settings.chunk_max_tokens)
+    ]
+    
+    if args.json:
+        print(json.dumps({"pages": len(pages), "chars": total_chars, "results": results}, indent=2))
+        return
+    
+    print(f"{len(pages)} pages, {total_chars / 1e6:.2f} MB")
+    columns = list(results[0].keys())
+    print("  ".join(f"{column:>17}" for column in columns))
+    for result in results:
+        print("  ".join(f"{str(result[column]):>17}" for column in columns))
+
+
+if __name__ == '__main__':
+    main()
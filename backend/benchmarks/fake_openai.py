@@ -0,0 +1,152 @@
+"""
+Stand-in for the OpenAI API, for offline benchmarks.
+
+Serves /v1/chat/completions (plain and streamed) and /v1/embeddings with
+configurable latency: completions wait --latency-ms before the first
+token and then emit --completion-tokens tokens at --tokens-per-second.
+Embeddings are deterministic pseudo-random unit vectors per input text.
+
+    python -m benchmarks.fake_openai --port 8100 --latency-ms 300
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 uvicorn main:app
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+import zlib
+from typing import Dict, List
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="Fake OpenAI")
+
+config = {
+    "latency_ms": 300.0,
+    "tokens_per_second": 80.0,
+    "completion_tokens": 120,
+    "embedding_latency_ms": 20.0,
+    "dimension": 1536
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def prompt_tokens(messages: List[Dict]) -> int:
+    return sum(estimate_tokens(message.get("content") or "") for message in messages)
+
+
+def completion_words(count: int) -> List[str]:
+    return [f"token{i} " for i in range(count)]
+
+
+def chunk(completion_id: str, model: str, delta: Dict, finish_reason=None) -> str:
+    return "data: " + json.dumps({
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }) + "\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    count = min(config["completion_tokens"], body.get("max_tokens") or config["completion_tokens"])
+    usage = {
+        "prompt_tokens": prompt_tokens(body.get("messages", [])),
+        "completion_tokens": count,
+        "total_tokens": prompt_tokens(body.get("messages", [])) + count
+    }
+    interval = 1 / config["tokens_per_second"]
+    
+    if body.get("stream"):
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+        
+        async def events():
+            await asyncio.sleep(config["latency_ms"] / 1000)
+            yield chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for word in completion_words(count):
+                yield chunk(completion_id, model, {"content": word})
+                await asyncio.sleep(interval)
+            yield chunk(completion_id, model, {}, finish_reason="stop")
+            if include_usage:
+                yield "data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": usage
+                }) + "\n\n"
+            yield "data: [DONE]\n\n"
+        
+        return StreamingResponse(events(), media_type="text/event-stream")
+    
+    await asyncio.sleep(config["latency_ms"] / 1000 + count * interval)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(completion_words(count))},
+            "finish_reason": "stop"
+        }],
+        "usage": usage
+    }
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    dimension = body.get("dimensions") or config["dimension"]
+    await asyncio.sleep(config["embedding_latency_ms"] / 1000)
+    
+    data = []
+    for index, text in enumerate(texts):
+        vector = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(dimension)
+        vector /= np.linalg.norm(vector)
+        data.append({"object": "embedding", "index": index, "embedding": vector.round(6).tolist()})
+    tokens = sum(estimate_tokens(text) for text in texts)
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "fake"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"], help="time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=config["tokens_per_second"])
+    parser.add_argument("--completion-tokens", type=int, default=config["completion_tokens"])
+    parser.add_argument("--embedding-latency-ms", type=float, default=config["embedding_latency_ms"])
+    parser.add_argument("--dimension", type=int, default=config["dimension"])
+    args = parser.parse_args()
+    config.update(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        embedding_latency_ms=args.embedding_latency_ms,
+        dimension=args.dimension
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
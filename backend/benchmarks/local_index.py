@@ -0,0 +1,136 @@
+"""
+Benchmark the in-process local index against the Qdrant query path.
+
+Builds a synthetic corpus of unit vectors with textbook-sized payloads,
+loads it into Qdrant (in-memory by default, or a server via --qdrant-url)
+and into a local index, then reports per-query latency, RSS growth and
+recall@k of the quantized index against exact float32 search.
+
+    python -m benchmarks.local_index --points 5000 --dtype int8 --json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+from local_index import LocalVectorIndex, write_index
+
+COLLECTION = "local_index_benchmark"
+
+
+def rss_mb() -> float:
+    """Resident set size of this process, in MB (Linux)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    return float("nan")
+
+
+def latency_summary(samples: List[float]) -> Dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95)] * 1000, 3),
+        "p99_ms": round(samples[int(len(samples) * 0.99)] * 1000, 3),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3)
+    }
+
+
+async def bench_qdrant(url: str, vectors: np.ndarray, payloads: List[Dict], queries: np.ndarray, limit: int) -> Dict:
+    before = rss_mb()
+    client = AsyncQdrantClient(location=url) if url == ":memory:" else AsyncQdrantClient(url=url)
+    if await client.collection_exists(COLLECTION):
+        await client.delete_collection(COLLECTION)
+    await client.create_collection(COLLECTION, vectors_config=VectorParams(size=vectors.shape[1], distance=Distance.COSINE))
+    for start in range(0, len(vectors), 256):
+        await client.upsert(COLLECTION, points=[
+            PointStruct(id=i, vector=vectors[i].tolist(), payload=payloads[i])
+            for i in range(start, min(start + 256, len(vectors)))
+        ])
+    loaded = rss_mb()
+    
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        await client.query_points(COLLECTION, query=query.tolist(), limit=limit)
+        samples.append(time.perf_counter() - started)
+    await client.delete_collection(COLLECTION)
+    await client.close()
+    return {"engine": "qdrant", "location": url, **latency_summary(samples), "rss_growth_mb": round(loaded - before, 1)}
+
+
+def bench_local(vectors: np.ndarray, payloads: List[Dict], queries: np.ndarray, limit: int, dtype: str) -> Dict:
+    with tempfile.TemporaryDirectory() as path:
+        meta = write_index(path, zip(vectors.tolist(), payloads), dtype=dtype)
+        disk_mb = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 1e6
+        before = rss_mb()
+        index = LocalVectorIndex(path)
+        
+        samples = []
+        found = []
+        for query in queries:
+            started = time.perf_counter()
+            hits = index.search(query.tolist(), limit)
+            samples.append(time.perf_counter() - started)
+            found.append({hit["metadata"]["id"] for hit in hits})
+        after = rss_mb()
+    
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :limit]
+    recall = statistics.mean(len(set(row.tolist()) & hits) / limit for row, hits in zip(exact, found))
+    return {
+        "engine": "local",
+        "dtype": meta["dtype"],
+        **latency_summary(samples),
+        "rss_growth_mb": round(after - before, 1),
+        "disk_mb": round(disk_mb, 1),
+        f"recall_at_{limit}": round(recall, 4)
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--points', type=int, default=5000)
+    parser.add_argument('--dimension', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--limit', type=int, default=5)
+    parser.add_argument('--dtype', default='int8', choices=['int8', 'float16'])
+    parser.add_argument('--qdrant-url', default=':memory:')
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.points, args.dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    payloads = [{"id": i, "text": f"chunk {i} " + "lorem ipsum " * 70, "source": f"module{i % 4}/page.mdx"} for i in range(args.points)]
+    # Queries near existing points, like real questions near their answers
+    queries = vectors[rng.integers(0, args.points, args.queries)] + 0.05 * rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    
+    results = [
+        bench_local(vectors, payloads, queries, args.limit, args.dtype),
+        await bench_qdrant(args.qdrant_url, vectors, payloads, queries, args.limit)
+    ]
+    
+    if args.json:
+        print(json.dumps({"points": args.points, "dimension": args.dimension, "results": results}, indent=2))
+        return
+    print(f"{args.points} points x {args.dimension} dims, {args.queries} queries, top {args.limit}")
+    for result in results:
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
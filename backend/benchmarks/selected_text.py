@@ -0,0 +1,205 @@
+"""
+Benchmark selected-text search: the fused single query against the old two-call path.
+
+Builds a synthetic textbook (pages of topic-specific chunks, embedded by a
+deterministic bag-of-words model with --embedding-latency-ms per request),
+loads it through QdrantService, then asks a question about a highlighted
+passage of a random chunk. Some highlights span two chunks, as real ones
+do. "fused" is QdrantService.search_selected_text; "legacy" is the previous
+implementation (embed the selection and the question, fetch 10 neighbours
+of the selection, keep those containing it as a substring). Reports latency
+percentiles, hit rate (the highlighted chunk is returned), MRR and how often
+a path returned nothing.
+
+In-memory Qdrant matches MatchText as a substring; pass --qdrant-url to
+measure against a server's tokenized full-text index.
+
+    python -m benchmarks.selected_text --chunks 2000 --queries 300 --json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("QDRANT_URL", ":memory:")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("AUTH_SECRET", "benchmark")
+os.environ["QDRANT_COLLECTION_NAME"] = "selected_text_benchmark"
+os.environ["EMBEDDING_CACHE_BACKEND"] = "none"
+os.environ["LOCAL_INDEX_ENABLED"] = "false"
+
+from embeddings import EmbeddingBackend  # noqa: E402
+from qdrant_service import QdrantService  # noqa: E402
+
+WORDS_PER_CHUNK = 80
+CHUNKS_PER_PAGE = 8
+
+
+class BagOfWordsEmbeddings(EmbeddingBackend):
+    """Sum of fixed random word vectors, so texts sharing words are close."""
+
+    name = "benchmark"
+
+    def __init__(self, dimension: int, latency_ms: float):
+        self.model = "bag-of-words"
+        self.dimension = dimension
+        self.latency = latency_ms / 1000
+        self._words: Dict[str, np.ndarray] = {}
+
+    def _word(self, word: str) -> np.ndarray:
+        vector = self._words.get(word)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(word.encode("utf-8")))
+            vector = self._words[word] = rng.standard_normal(self.dimension).astype(np.float32)
+        return vector
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        vectors = []
+        for text in texts:
+            vector = np.sum([self._word(word) for word in text.lower().split()], axis=0)
+            vectors.append((vector / np.linalg.norm(vector)).tolist())
+        return vectors
+
+
+async def legacy_search_selected_text(service: QdrantService, selected_text: str, query: str, limit: int) -> List[Dict]:
+    """search_selected_text before the fused query, kept for comparison."""
+    selected_embedding = await service.get_embedding(selected_text)
+    context_results = await service.client.query_points(
+        collection_name=service.collection_name,
+        query=selected_embedding,
+        limit=10
+    )
+    # Computed but never used for ranking
+    await service.get_embedding(query)
+    filtered_results = [
+        hit for hit in context_results.points
+        if selected_text.lower() in hit.payload["text"].lower()
+    ]
+    return service._format_hits(filtered_results[:limit])
+
+
+def build_corpus(chunks: int, topics: int, rng: np.random.Generator) -> List[Dict]:
+    vocabulary = [[f"t{topic}w{i}" for i in range(300)] for topic in range(topics)]
+    common = [f"c{i}" for i in range(200)]
+    documents = []
+    for index in range(chunks):
+        page = index // CHUNKS_PER_PAGE
+        words = rng.choice(vocabulary[page % topics] + common, WORDS_PER_CHUNK).tolist()
+        documents.append({
+            "id": index + 1,
+            "text": " ".join(words),
+            "metadata": {"source": f"page{page}.md", "chunk_index": index % CHUNKS_PER_PAGE}
+        })
+    return documents
+
+
+def chunk_of(document: Dict) -> Tuple[str, int]:
+    return document["metadata"]["source"], document["metadata"]["chunk_index"]
+
+
+def make_query(documents: List[Dict], rng: np.random.Generator, span_fraction: float) -> Dict:
+    """A highlighted passage of one chunk (sometimes running into the next) and a question about it."""
+    index = int(rng.integers(0, len(documents) - 1))
+    words = documents[index]["text"].split()
+    length = int(rng.integers(6, 16))
+    spans = rng.random() < span_fraction and (index + 1) % CHUNKS_PER_PAGE != 0
+    if spans:
+        head = length // 2
+        selection = words[-head:] + documents[index + 1]["text"].split()[:length - head]
+        relevant = {chunk_of(documents[index]), chunk_of(documents[index + 1])}
+    else:
+        start = int(rng.integers(0, len(words) - length))
+        selection = words[start:start + length]
+        relevant = {chunk_of(documents[index])}
+    question = " ".join(rng.choice(selection, 3).tolist() + ["what", "does", "this", "mean"])
+    return {"selected_text": " ".join(selection), "question": question, "relevant": relevant, "spans": spans}
+
+
+def summarize(name: str, samples: List[float], ranks: List[Optional[int]], empty: int, limit: int) -> Dict:
+    samples = sorted(samples)
+    return {
+        "path": name,
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95)] * 1000, 2),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+        f"hit_rate_at_{limit}": round(sum(rank is not None for rank in ranks) / len(ranks), 4),
+        "mrr": round(statistics.mean(1 / rank if rank else 0.0 for rank in ranks), 4),
+        "empty_results": empty
+    }
+
+
+async def run(args) -> Dict:
+    rng = np.random.default_rng(args.seed)
+    service = QdrantService()
+    service.embedding_backend = BagOfWordsEmbeddings(args.dimension, args.embedding_latency_ms)
+    if args.qdrant_url:
+        from qdrant_client import AsyncQdrantClient
+        service.client = AsyncQdrantClient(url=args.qdrant_url)
+
+    await service.delete_collection()
+    await service.create_collection()
+    documents = build_corpus(args.chunks, args.topics, rng)
+    await service.add_documents(documents)
+    queries = [make_query(documents, rng, args.span_fraction) for _ in range(args.queries)]
+
+    paths = {
+        "legacy": lambda q: legacy_search_selected_text(service, q["selected_text"], q["question"], args.limit),
+        "fused": lambda q: service.search_selected_text(q["selected_text"], q["question"], limit=args.limit)
+    }
+    results = []
+    for name, search in paths.items():
+        samples, ranks, empty = [], [], 0
+        for query in queries:
+            started = time.perf_counter()
+            hits = await search(query)
+            samples.append(time.perf_counter() - started)
+            empty += not hits
+            ranks.append(next((rank for rank, hit in enumerate(hits, 1) if chunk_of(hit) in query["relevant"]), None))
+        results.append(summarize(name, samples, ranks, empty, args.limit))
+
+    await service.delete_collection()
+    await service.close()
+    return {
+        "chunks": args.chunks,
+        "queries": args.queries,
+        "spanning_queries": sum(query["spans"] for query in queries),
+        "embedding_latency_ms": args.embedding_latency_ms,
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=3)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--span-fraction", type=float, default=0.25, help="highlights that run into the next chunk")
+    parser.add_argument("--embedding-latency-ms", type=float, default=30, help="simulated embeddings request latency")
+    parser.add_argument("--qdrant-url", help="Qdrant server to use instead of in-memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['chunks']} chunks, {report['queries']} queries ({report['spanning_queries']} spanning two chunks), "
+          f"{report['embedding_latency_ms']} ms per embeddings request")
+    for result in report["results"]:
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
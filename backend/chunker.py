@@ -0,0 +1,206 @@
+"""
+Token-aware structural chunker for markdown/MDX pages.
+
+Splits a page into blocks (headings, paragraphs, fenced code, admonitions)
+in one pass, then packs consecutive blocks into chunks up to a token
+budget. Chunks break at headings once they are reasonably full, code
+blocks and admonitions are never cut mid-way unless they alone exceed the
+budget, and each chunk carries the heading path it sits under. Text with
+no usable break (a huge table, one very long sentence) is cut at line
+breaks, and failing that every max_tokens tokens, so no chunk exceeds the
+budget.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+from tokens import count_tokens, split_tokens
+
+# Bump whenever chunk boundaries change, so ingestion re-chunks unchanged files
+CHUNKER_VERSION = 2
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+FENCE_RE = re.compile(r'^\s*(`{3,}|~{3,})')
+ADMONITION_OPEN_RE = re.compile(r'^\s*:::\s*\w+')
+ADMONITION_CLOSE_RE = re.compile(r'^\s*:::\s*$')
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def _parse_blocks(text: str) -> List[Dict]:
+    """Split markdown into heading, code, admonition and paragraph blocks."""
+    blocks = []
+    heading_path: List[str] = []
+    lines: List[str] = []
+    kind = 'paragraph'
+    fence = None
+    
+    def close(next_kind: str = 'paragraph'):
+        nonlocal lines, kind
+        body = '\n'.join(lines).strip('\n')
+        if body.strip():
+            blocks.append({'kind': kind, 'text': body, 'heading_path': list(heading_path)})
+        lines = []
+        kind = next_kind
+    
+    for line in text.split('\n'):
+        if kind == 'code':
+            lines.append(line)
+            if line.strip().startswith(fence) and line.strip().strip(fence[0]) == '':
+                close()
+            continue
+        if kind == 'admonition':
+            lines.append(line)
+            if ADMONITION_CLOSE_RE.match(line):
+                close()
+            continue
+        
+        fence_match = FENCE_RE.match(line)
+        if fence_match:
+            close('code')
+            fence = fence_match.group(1)
+            lines.append(line)
+            continue
+        if ADMONITION_OPEN_RE.match(line):
+            close('admonition')
+            lines.append(line)
+            continue
+        heading_match = HEADING_RE.match(line)
+        if heading_match:
+            close()
+            level = len(heading_match.group(1))
+            del heading_path[level - 1:]
+            heading_path.extend([''] * (level - 1 - len(heading_path)))
+            heading_path.append(heading_match.group(2))
+            blocks.append({'kind': 'heading', 'text': line.strip(), 'heading_path': list(heading_path)})
+            continue
+        if not line.strip():
+            close()
+            continue
+        lines.append(line)
+    close()
+    
+    for block in blocks:
+        block['heading_path'] = [title for title in block['heading_path'] if title]
+    return blocks
+
+
+def _hard_split(text: str, max_tokens: int) -> List[str]:
+    """Split text at line breaks where possible, otherwise every max_tokens tokens."""
+    parts = []
+    current: List[str] = []
+    current_tokens = 0
+    for line in text.split('\n'):
+        # Re-encoding a cut piece can cost a token more at its edges
+        pieces = split_tokens(line, max_tokens - 2) if count_tokens(line) + 1 > max_tokens else [line]
+        for piece in pieces:
+            piece_tokens = count_tokens(piece) + 1
+            if current and current_tokens + piece_tokens > max_tokens:
+                parts.append('\n'.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        parts.append('\n'.join(current))
+    return parts
+
+
+def _split_oversized(block: Dict, max_tokens: int) -> List[Dict]:
+    """Split a block larger than the budget into budget-sized pieces."""
+    if block['kind'] == 'code':
+        lines = block['text'].split('\n')
+        opening, body = lines[0], lines[1:-1]
+        closing = lines[-1] if len(lines) > 1 else opening.strip()[:3]
+        units = body
+        joiner = '\n'
+        overhead = count_tokens(opening) + count_tokens(closing) + 2
+    else:
+        opening = closing = None
+        units = SENTENCE_END_RE.split(block['text'])
+        joiner = ' '
+        overhead = 0
+    
+    pieces = []
+    current: List[str] = []
+    current_tokens = overhead
+    for unit in units:
+        unit_tokens = count_tokens(unit) + 1
+        if overhead + unit_tokens > max_tokens:
+            # No sentence or line break small enough; this unit gets pieces of its own
+            if current:
+                pieces.append(current)
+                current, current_tokens = [], overhead
+            pieces.extend([part] for part in _hard_split(unit, max_tokens - overhead))
+            continue
+        if current and current_tokens + unit_tokens > max_tokens:
+            pieces.append(current)
+            current, current_tokens = [], overhead
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        pieces.append(current)
+    
+    result = []
+    for piece in pieces:
+        text = joiner.join(piece)
+        if opening is not None:
+            text = f"{opening}\n{text}\n{closing}"
+        result.append({**block, 'text': text, 'tokens': count_tokens(text)})
+    return result
+
+
+def chunk_markdown(
+    text: str,
+    max_tokens: int = 400,
+    min_tokens: int = 200
+) -> List[Dict]:
+    """
+    Chunk markdown into pieces of at most max_tokens tokens.
+    
+    A heading starts a new chunk once the current chunk holds min_tokens.
+    Returns [{"text": ..., "heading_path": [...], "tokens": n}, ...].
+    """
+    blocks = []
+    for block in _parse_blocks(text):
+        block['tokens'] = count_tokens(block['text'])
+        if block['tokens'] > max_tokens:
+            blocks.extend(_split_oversized(block, max_tokens))
+        else:
+            blocks.append(block)
+    
+    chunks = []
+    current: List[Dict] = []
+    current_tokens = 0
+    heading_path: Optional[List[str]] = None
+    
+    def flush():
+        nonlocal current, current_tokens, heading_path
+        # A chunk made only of headings carries no content of its own
+        if any(block['kind'] != 'heading' for block in current):
+            chunks.append({
+                'text': '\n\n'.join(block['text'] for block in current),
+                'heading_path': heading_path or [],
+                'tokens': current_tokens
+            })
+        current, current_tokens, heading_path = [], 0, None
+    
+    for block in blocks:
+        # Blocks are joined by a blank line, which costs about one token
+        block_tokens = block['tokens'] + 1
+        starts_section = block['kind'] == 'heading' and current_tokens >= min_tokens
+        if current and (starts_section or current_tokens + block_tokens > max_tokens):
+            # Keep trailing headings with the content they introduce
+            carried = []
+            while current and current[-1]['kind'] == 'heading':
+                carried.insert(0, current.pop())
+            current_tokens -= sum(item['tokens'] + 1 for item in carried)
+            flush()
+            current = carried
+            current_tokens = sum(item['tokens'] + 1 for item in carried)
+        if heading_path is None or (block['kind'] == 'heading' and all(item['kind'] == 'heading' for item in current)):
+            heading_path = block['heading_path']
+        current.append(block)
+        current_tokens += block_tokens
+    if current:
+        flush()
+    
+    return chunks
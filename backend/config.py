@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
@@ -8,25 +8,121 @@ class Settings(BaseSettings):
     # OpenAI
     openai_api_key: str
     openai_model: str = "gpt-4o-mini"
+    openai_base_url: Optional[str] = None  # OpenAI-compatible endpoint, e.g. benchmarks/fake_openai.py
+    
+    # Upstream scheduling (upstream.py); 0 disables a budget
+    upstream_rpm: int = 500  # chat completion requests per minute
+    upstream_tpm: int = 200000  # chat completion tokens per minute (prompt + max_tokens, corrected by usage)
+    upstream_embedding_rpm: int = 3000
+    upstream_embedding_tpm: int = 1000000
+    upstream_initial_concurrency: int = 16  # calls in flight; adapted between min and max
+    upstream_min_concurrency: int = 2
+    upstream_max_concurrency: int = 64
+    upstream_latency_tolerance: float = 2.0  # back off when a call takes this many times its usual latency
+    upstream_max_retries: int = 3  # for 429s, timeouts, connection errors and 5xx
+    upstream_retry_base_delay: float = 0.5  # seconds; doubled per attempt, full jitter
+    upstream_retry_max_delay: float = 8.0
+    upstream_interactive_deadline: float = 10.0  # seconds chat may queue before a 503
+    upstream_bulk_deadline: float = 60.0  # seconds personalize/translate/ingest may queue
     
     # Qdrant
-    qdrant_url: str
+    qdrant_url: str  # ":memory:" runs an in-process Qdrant (benchmarks, local experiments)
     qdrant_api_key: Optional[str] = None
     qdrant_collection_name: str = "physical_ai_textbook"
     
     # Neon Database
     database_url: str
+    db_pool_size: int = 5  # 0 disables client-side pooling (NullPool)
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 10.0  # seconds to wait for a free connection
+    db_pool_recycle: int = 240  # reconnect before Neon drops idle connections
+    db_pool_pre_ping: bool = True
+    db_pgbouncer: bool = False  # set for Neon -pooler URLs (PgBouncer transaction mode)
     
     # Auth
     auth_secret: str
     auth_url: str = "http://localhost:8000"
+    profile_cache_ttl_seconds: int = 300
+    profile_cache_max_entries: int = 10000
+    bcrypt_rounds: int = 12  # cost factor for new hashes; existing hashes keep theirs
+    bcrypt_workers: int = 2  # threads hashing passwords
+    bcrypt_max_pending: int = 64  # hashes running or queued before logins get 503
     
     # CORS
     frontend_url: str = "http://localhost:3000"
     
+    # Observability
+    metrics_enabled: bool = True  # /metrics, stage histograms and token counters
+    
+    # Retrieval
+    retrieval_mode: str = "dense"  # dense, or hybrid (dense + local BM25 sparse vectors, fused with RRF)
+    bm25_avg_doc_tokens: int = 256
+    local_index_enabled: bool = False  # serve dense search from an in-process index built by ingest_content.py (dense retrieval_mode only)
+    local_index_path: str = ".cache/local_index"
+    local_index_dtype: str = "int8"  # int8 or float16
+    
+    # Reranking
+    rerank_enabled: bool = False  # rerank over-fetched candidates with a local CPU cross-encoder
+    rerank_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    rerank_candidates: int = 20  # chunks fetched from the index before reranking
+    rerank_top_k: int = 5  # chunks kept for the prompt
+    rerank_min_score: float = 0.1  # relevance cutoff on the cross-encoder score
+    rerank_budget_ms: int = 150  # per-request scoring budget; unscored chunks keep retrieval order
+    rerank_batch_size: int = 8
+    rerank_threads: int = 2
+    
+    # Prompt context
+    context_token_budget: int = 3000  # prompt tokens for selected text + retrieved context
+    context_token_budgets: Dict[str, int] = {}  # per-model overrides, e.g. {"gpt-4o": 6000}
+    selected_text_max_tokens: int = 1000
+    question_max_tokens: int = 500
+    
+    # Conversation memory (prompt tokens per turn stay under system prompt +
+    # history + context budget + question caps, however long the session)
+    conversation_recent_turns: int = 4  # turns kept verbatim; older ones are summarized
+    conversation_history_max_tokens: int = 1500  # summary + verbatim turns
+    conversation_summary_max_tokens: int = 300
+    conversation_cache_sessions: int = 1000
+    
     # Embedding
+    embedding_backend: str = "openai"  # openai, or local (sentence-transformers on CPU)
     embedding_model: str = "text-embedding-3-small"
     embedding_dimension: int = 1536
+    local_embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    local_embedding_runtime: str = "torch"  # torch or onnx
+    local_embedding_threads: int = 2
+    local_embedding_batch_size: int = 64
+    embedding_batch_size: int = 128  # texts per embeddings request
+    embedding_batch_max_tokens: int = 100000  # token budget per embeddings request
+    embedding_max_concurrency: int = 4  # embeddings requests in flight during ingestion
+    qdrant_upsert_batch_size: int = 256  # points per Qdrant upsert
+    chunk_max_tokens: int = 400  # token budget per ingested chunk
+    chunk_min_tokens: int = 200  # chunks smaller than this absorb the next section
+    
+    # Embedding cache
+    embedding_cache_backend: str = "sqlite"  # none, memory, sqlite (memory LRU + SQLite file)
+    embedding_cache_path: str = ".cache/embeddings.sqlite3"
+    embedding_cache_max_memory_mb: int = 32  # packed float32, about 5k 1536-d vectors
+    embedding_cache_max_disk_mb: int = 512
+    
+    # Batch question answering
+    batch_answer_max_questions: int = 200
+    batch_answer_concurrency: int = 8  # completions in flight per batch request
+    
+    # Semantic answer cache
+    answer_cache_enabled: bool = True
+    answer_cache_threshold: float = 0.95  # minimum cosine similarity for a hit
+    answer_cache_ttl_seconds: int = 3600
+    answer_cache_max_entries: int = 2000
+    answer_cache_version_check_seconds: float = 5.0  # how often to look for writes by other processes (ingest_content.py)
+    
+    # Chat history writer
+    history_queue_size: int = 10000  # turns buffered before new ones are dropped
+    history_batch_size: int = 100  # rows per bulk insert
+    history_flush_interval: float = 1.0  # seconds a queued turn may wait for its batch
+    
+    # Personalized / translated page variants
+    content_cache_memory_entries: int = 512
     
     class Config:
         env_file = ".env"
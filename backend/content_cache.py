@@ -0,0 +1,158 @@
+"""
+Cache of personalized and translated page variants.
+
+There are only nine (software, hardware) experience tiers plus Urdu, so
+rewrites are keyed by (content hash, profile tier, language) and shared by
+every user: an in-process LRU in front of the content_variants table.
+Because the key is the text the variant was generated from, a request can
+only ever be served a rewrite of exactly what it posted, and an edited page
+simply misses. Rows written by the pre-generation job also record the page
+they belong to, so the job can drop variants of a page's old versions.
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import ContentVariant
+
+# Translation does not depend on the reader's profile
+ANY_TIER = "any"
+
+
+def content_hash(content: str) -> str:
+    """Hash page content, ignoring line endings and leading and trailing whitespace."""
+    return hashlib.sha256(content.replace("\r\n", "\n").strip().encode("utf-8")).hexdigest()
+
+
+def page_key(page_path: str) -> str:
+    """
+    Canonical id of a docs page: its path under docs/ without the extension.
+    Accepts site URLs ("/physical-ai-textbook/docs/module1/ros2-fundamentals/")
+    and source paths ("module1/ros2-fundamentals.mdx") alike.
+    """
+    path = re.split(r"[?#]", page_path, maxsplit=1)[0]
+    path = ("/" + path).split("/docs/", 1)[-1]
+    path = re.sub(r"\.mdx?$", "", path.strip("/"))
+    return re.sub(r"(^|/)index$", "", path)
+
+
+class ContentVariantCache:
+    """Memory LRU over the content_variants table."""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+    
+    def _remember(self, key: Tuple[str, str, str], content: str):
+        self._entries[key] = content
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    async def get(
+        self,
+        db: AsyncSession,
+        content: str,
+        profile_tier: str,
+        language: str
+    ) -> Optional[str]:
+        """Return a cached variant, or None."""
+        key = (content_hash(content), profile_tier, language)
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return cached
+        
+        result = await db.execute(
+            select(ContentVariant.content).where(
+                ContentVariant.content_hash == key[0],
+                ContentVariant.profile_tier == profile_tier,
+                ContentVariant.language == language
+            )
+        )
+        stored = result.scalar_one_or_none()
+        if stored is not None:
+            self._remember(key, stored)
+            self.db_hits += 1
+        return stored
+    
+    async def put(
+        self,
+        db: AsyncSession,
+        content: str,
+        profile_tier: str,
+        language: str,
+        variant: str,
+        page_path: Optional[str] = None
+    ):
+        """
+        Store a variant generated from `content`; a concurrent writer for the
+        same key wins silently. page_path is only passed by the
+        pre-generation job, never taken from a request.
+        """
+        key = (content_hash(content), profile_tier, language)
+        self._remember(key, variant)
+        db.add(ContentVariant(
+            content_hash=key[0],
+            profile_tier=profile_tier,
+            language=language,
+            page_path=page_key(page_path) if page_path else None,
+            content=variant
+        ))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+    
+    async def prune_page(self, db: AsyncSession, page_path: str, content: str) -> int:
+        """Delete a page's variants generated from any other version of it. Returns the number deleted."""
+        result = await db.execute(delete(ContentVariant).where(
+            ContentVariant.page_path == page_key(page_path),
+            ContentVariant.content_hash != content_hash(content)
+        ))
+        await db.commit()
+        return result.rowcount
+    
+    async def get_or_generate(
+        self,
+        db: AsyncSession,
+        content: str,
+        profile_tier: str,
+        language: str,
+        generate: Callable[[], Awaitable[str]]
+    ) -> str:
+        """Serve a cached variant, generating and storing it on a miss."""
+        cached = await self.get(db, content, profile_tier, language)
+        if cached is not None:
+            return cached
+        self.misses += 1
+        # End the read's transaction so the pooled connection isn't held for the whole LLM call
+        await db.rollback()
+        variant = await generate()
+        await self.put(db, content, profile_tier, language, variant)
+        return variant
+    
+    def stats(self) -> Dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        hits = self.memory_hits + self.db_hits
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+content_cache = ContentVariantCache(settings.content_cache_memory_entries)
@@ -0,0 +1,173 @@
+"""
+Token-budgeted context assembly for RAG prompts.
+
+Retrieved chunks are grouped into blocks of consecutive chunks from the
+same source, with overlapping text between neighbours stitched out and
+paragraphs already present elsewhere in the context dropped. Blocks are
+then added best-first until the prompt budget for the model is spent.
+The user's selected text goes in ahead of the retrieved context.
+"""
+
+import hashlib
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from tokens import count_tokens, truncate_tokens
+
+# Longest overlap looked for between the end of one chunk and the start of the next
+MAX_OVERLAP_CHARS = 1000
+# Shorter matches (a fence, a common word ending) are coincidences, not chunker overlap
+MIN_OVERLAP_CHARS = 32
+# Shorter paragraphs (fences, list stubs) are never treated as duplicates
+MIN_DEDUPE_CHARS = 40
+# Don't bother truncating a block into less room than this
+MIN_BLOCK_TOKENS = 64
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def context_budget(model: str) -> int:
+    """Prompt tokens available for context with the given model."""
+    return settings.context_token_budgets.get(model, settings.context_token_budget)
+
+
+def _overlap(left: str, right: str) -> int:
+    """
+    Length of the longest suffix of left that is also a prefix of right,
+    starting at a word boundary and at least MIN_OVERLAP_CHARS long; else 0.
+    """
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        starts_word = size == len(left) or left[-size - 1].isspace()
+        if starts_word and left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_adjacent(chunks: List[Dict]) -> List[Dict]:
+    """Join consecutive chunks of the same source into blocks, best-scoring block first."""
+    blocks: List[Dict] = []
+    by_position: Dict[Tuple[str, int], Dict] = {}
+    ordered = sorted(
+        chunks,
+        key=lambda chunk: (
+            chunk["metadata"].get("source", ""),
+            chunk["metadata"].get("chunk_index", -1)
+        )
+    )
+    for chunk in ordered:
+        source = chunk["metadata"].get("source", "Unknown")
+        index = chunk["metadata"].get("chunk_index")
+        previous = by_position.get((source, index - 1)) if index is not None else None
+        if previous is not None:
+            cut = _overlap(previous["text"], chunk["text"])
+            previous["text"] += ("" if cut else "\n\n") + chunk["text"][cut:]
+            previous["score"] = max(previous["score"], chunk["score"])
+            previous["chunks"] += 1
+            block = previous
+        else:
+            block = {"source": source, "text": chunk["text"], "score": chunk["score"], "chunks": 1}
+            blocks.append(block)
+        if index is not None:
+            by_position[(source, index)] = block
+    blocks.sort(key=lambda block: block["score"], reverse=True)
+    return blocks
+
+
+def _dedupe_paragraphs(text: str, seen: set) -> str:
+    """Drop paragraphs whose normalized text is already in the context."""
+    kept = []
+    for paragraph in text.split("\n\n"):
+        normalized = WHITESPACE_RE.sub(" ", paragraph).strip().lower()
+        if len(normalized) >= MIN_DEDUPE_CHARS:
+            digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+        kept.append(paragraph)
+    return "\n\n".join(kept).strip()
+
+
+def build_context(
+    context_chunks: List[Dict],
+    selected_text: Optional[str] = None,
+    model: Optional[str] = None
+) -> Tuple[str, Dict]:
+    """
+    Assemble the prompt context for retrieved chunks.
+    
+    Returns (context text, stats) where stats compares the context's token
+    count with naively concatenating every chunk.
+    """
+    model = model or settings.openai_model
+    remaining = context_budget(model)
+    sections = []
+    seen: set = set()
+    
+    naive_tokens = sum(
+        count_tokens(f"[Source: {chunk['metadata'].get('source', 'Unknown')}]\n{chunk['text']}", model)
+        for chunk in context_chunks
+    )
+    
+    if selected_text:
+        selected = truncate_tokens(selected_text.strip(), settings.selected_text_max_tokens, model)
+        _dedupe_paragraphs(selected, seen)
+        section = f"[Selected by the reader]\n{selected}"
+        sections.append(section)
+        remaining -= count_tokens(section, model) + 1  # + separator
+    
+    blocks_used = 0
+    for block in _merge_adjacent(context_chunks):
+        text = _dedupe_paragraphs(block["text"], seen)
+        if not text:
+            continue
+        section = f"[Source: {block['source']}]\n{text}"
+        tokens = count_tokens(section, model)
+        if tokens > remaining:
+            if remaining < MIN_BLOCK_TOKENS:
+                break
+            section = truncate_tokens(section, remaining, model)
+            tokens = remaining
+        sections.append(section)
+        remaining -= tokens + 1
+        blocks_used += 1
+    
+    context = "\n\n".join(sections)
+    context_tokens = count_tokens(context, model) if context else 0
+    return context, {
+        "chunks": len(context_chunks),
+        "blocks": blocks_used,
+        "naive_tokens": naive_tokens,
+        "context_tokens": context_tokens
+    }
+
+
+class ContextStats:
+    """Running totals of prompt tokens saved by the context builder."""
+    
+    def __init__(self):
+        self.requests = 0
+        self.naive_tokens = 0
+        self.context_tokens = 0
+        self.last: Optional[Dict] = None
+        self._lock = threading.Lock()
+    
+    def record(self, stats: Dict):
+        with self._lock:
+            self.requests += 1
+            self.naive_tokens += stats["naive_tokens"]
+            self.context_tokens += stats["context_tokens"]
+            self.last = stats
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            saved = self.naive_tokens - self.context_tokens
+            return {
+                "requests": self.requests,
+                "naive_tokens": self.naive_tokens,
+                "context_tokens": self.context_tokens,
+                "saved_tokens": saved,
+                "saved_per_request": round(saved / self.requests, 1) if self.requests else 0.0,
+                "last": self.last
+            }
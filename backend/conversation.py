@@ -0,0 +1,155 @@
+"""
+Session memory for multi-turn chat.
+
+The last few turns of a session are kept verbatim; turns that fall out of
+that window are folded into a rolling summary in the background. Sessions
+live in an in-process LRU and are loaded from chat_history on a miss, so
+a follow-up only costs a database query the first time a session is seen
+by this process. Sessions belong to the user who started them: a session
+id only reaches turns asked by the same user (or, for anonymous chats,
+turns asked anonymously).
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from config import settings
+from database import SessionLocal, ChatHistory
+from tokens import count_tokens, truncate_tokens
+
+# (question, answer)
+Turn = Tuple[str, str]
+# (user id or None for anonymous chats, session id)
+SessionKey = Tuple[Optional[int], str]
+
+
+class _Session:
+    """Summary of older turns plus the most recent turns verbatim."""
+    
+    def __init__(self):
+        self.summary = ""
+        self.pending: List[Turn] = []  # out of the verbatim window, not yet summarized
+        self.turns: List[Turn] = []
+        self.summarizing = False
+
+
+class ConversationMemory:
+    """LRU of chat sessions with token-capped history for prompts."""
+    
+    def __init__(
+        self,
+        summarize: Callable[[str, List[Turn]], Awaitable[str]],
+        max_sessions: int
+    ):
+        self.summarize = summarize
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[SessionKey, _Session]" = OrderedDict()
+        self._tasks = set()
+        self.hits = 0
+        self.loads = 0
+        self.summaries = 0
+    
+    def _remember(self, key: SessionKey, session: _Session):
+        self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+    
+    async def _get(self, key: SessionKey) -> _Session:
+        session = self._sessions.get(key)
+        if session is not None:
+            self._sessions.move_to_end(key)
+            self.hits += 1
+            return session
+        
+        # Uses the (session_id, created_at) index; anything older than the
+        # loaded window is not reflected in the summary of a reloaded session
+        user_id, session_id = key
+        owner = ChatHistory.user_id.is_(None) if user_id is None else ChatHistory.user_id == user_id
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(ChatHistory.question, ChatHistory.answer)
+                .where(ChatHistory.session_id == session_id, owner)
+                .order_by(ChatHistory.created_at.desc(), ChatHistory.id.desc())
+                .limit(settings.conversation_recent_turns * 2)
+            )
+            rows = [(question, answer) for question, answer in result.all()][::-1]
+        self.loads += 1
+        
+        session = self._sessions.get(key)
+        if session is None:
+            session = _Session()
+            session.turns = rows
+            self._remember(key, session)
+            self._roll(session)
+        return session
+    
+    def _roll(self, session: _Session):
+        """Move turns out of the verbatim window and summarize them in the background."""
+        overflow = len(session.turns) - settings.conversation_recent_turns
+        if overflow > 0:
+            session.pending.extend(session.turns[:overflow])
+            del session.turns[:overflow]
+        if session.pending and not session.summarizing:
+            session.summarizing = True
+            task = asyncio.create_task(self._summarize(session))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _summarize(self, session: _Session):
+        try:
+            while session.pending:
+                batch = list(session.pending)
+                summary = await self.summarize(session.summary, batch)
+                session.summary = truncate_tokens(summary, settings.conversation_summary_max_tokens)
+                del session.pending[:len(batch)]
+                self.summaries += 1
+        except Exception as e:
+            # Pending turns stay in the prompt and are retried after the next turn
+            print(f"Conversation summary failed: {e}")
+        finally:
+            session.summarizing = False
+    
+    async def history(self, session_id: str, user_id: Optional[int]) -> Dict:
+        """
+        Return {"summary": str, "turns": [(question, answer), ...]} for a
+        session of this user, newest turns kept first, within
+        conversation_history_max_tokens.
+        """
+        session = await self._get((user_id, session_id))
+        remaining = settings.conversation_history_max_tokens
+        summary = session.summary
+        if summary:
+            remaining -= count_tokens(summary)
+        
+        turns: List[Turn] = []
+        for question, answer in reversed(session.pending + session.turns):
+            tokens = count_tokens(question) + count_tokens(answer)
+            if tokens > remaining:
+                break
+            turns.append((question, answer))
+            remaining -= tokens
+        turns.reverse()
+        return {"summary": summary, "turns": turns}
+    
+    def append(self, session_id: str, user_id: Optional[int], question: str, answer: str):
+        """Record a finished turn."""
+        key = (user_id, session_id)
+        session = self._sessions.get(key)
+        if session is None:
+            # A new session; existing ones were loaded by history() for this turn
+            session = _Session()
+            self._remember(key, session)
+        session.turns.append((question, answer))
+        self._roll(session)
+    
+    def stats(self) -> Dict:
+        return {
+            "sessions": len(self._sessions),
+            "hits": self.hits,
+            "loads": self.loads,
+            "summaries": self.summaries
+        }
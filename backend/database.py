@@ -1,15 +1,139 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Index, JSON, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import event, exc
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from datetime import datetime
+from typing import Dict
+from uuid import uuid4
+import time
 from config import settings
 
+
+def get_async_database_url(url: str) -> URL:
+    """Map a plain database URL onto its asyncio driver.
+
+    Neon hands out ``postgresql://...?sslmode=require&channel_binding=require``
+    URLs; asyncpg expects ``ssl`` instead of ``sslmode`` and rejects
+    ``channel_binding``.
+    """
+    db_url = make_url(url)
+    if db_url.drivername in ("postgres", "postgresql", "postgresql+psycopg2"):
+        query = dict(db_url.query)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        query.pop("channel_binding", None)
+        db_url = db_url.set(drivername="postgresql+asyncpg", query=query)
+    elif db_url.drivername == "sqlite":
+        db_url = db_url.set(drivername="sqlite+aiosqlite")
+    return db_url
+
+
+class PoolStats:
+    """Counters for the connection pool, reported by pool_stats()."""
+    
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+
+POOL_STATS = PoolStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how often and how long checkouts wait for a connection."""
+    
+    def _do_get(self):
+        exhausted = self.checkedout() >= self.size() + settings.db_max_overflow
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_STATS.timeouts += 1
+            raise
+        finally:
+            if exhausted:
+                waited = time.perf_counter() - started
+                POOL_STATS.waits += 1
+                POOL_STATS.wait_seconds += waited
+                POOL_STATS.max_wait_seconds = max(POOL_STATS.max_wait_seconds, waited)
+
+
+def get_engine_options(db_url: URL) -> Dict:
+    """
+    Pool settings for Postgres. Neon closes idle connections, so they are
+    recycled and pinged before use. Behind PgBouncer (Neon's -pooler
+    endpoints) asyncpg must not cache prepared statements.
+    """
+    if db_url.get_backend_name() != "postgresql":
+        return {}
+    if settings.db_pool_size == 0:
+        options = {"poolclass": NullPool}
+    else:
+        options = {
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": settings.db_pool_size,
+            "max_overflow": settings.db_max_overflow,
+            "pool_timeout": settings.db_pool_timeout,
+            "pool_recycle": settings.db_pool_recycle,
+            "pool_pre_ping": settings.db_pool_pre_ping
+        }
+    if settings.db_pgbouncer:
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"
+        }
+    return options
+
+
 # Create database engine
-engine = create_engine(settings.database_url)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+database_url = get_async_database_url(settings.database_url)
+engine = create_async_engine(database_url, **get_engine_options(database_url))
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
+@event.listens_for(engine.sync_engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    POOL_STATS.connects += 1
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    POOL_STATS.checkouts += 1
+
+
+@event.listens_for(engine.sync_engine, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    POOL_STATS.invalidations += 1
+
+
+def pool_stats() -> Dict:
+    """Current pool occupancy plus lifetime counters."""
+    pool = engine.sync_engine.pool
+    stats = {
+        "pool": type(pool).__name__,
+        "connects": POOL_STATS.connects,
+        "checkouts": POOL_STATS.checkouts,
+        "invalidations": POOL_STATS.invalidations,
+        "waits": POOL_STATS.waits,
+        "mean_wait_ms": round(POOL_STATS.wait_seconds / POOL_STATS.waits * 1000, 2) if POOL_STATS.waits else 0.0,
+        "max_wait_ms": round(POOL_STATS.max_wait_seconds * 1000, 2),
+        "timeouts": POOL_STATS.timeouts
+    }
+    if hasattr(pool, "checkedout"):
+        stats.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return stats
+
+
 class User(Base):
     """User model for authentication and profiling."""
     __tablename__ = "users"
@@ -22,6 +146,9 @@ class User(Base):
     # Background profiling
     software_experience = Column(String(50))  # beginner, intermediate, advanced
     hardware_experience = Column(String(50))  # beginner, intermediate, advanced
+    # Bumped on every profile update; tokens carry the version they were issued with.
+    # Older databases: ALTER TABLE users ADD COLUMN profile_version INTEGER NOT NULL DEFAULT 1
+    profile_version = Column(Integer, nullable=False, default=1, server_default="1")
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -37,9 +164,17 @@ class ChatHistory(Base):
     
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
-    context_used = Column(Text)  # JSON string of retrieved chunks
+    # Sources returned with the answer. Older databases have a TEXT column:
+    # ALTER TABLE chat_history ALTER COLUMN context_used TYPE JSONB USING to_jsonb(context_used)
+    context_used = Column(JSON().with_variant(JSONB(), "postgresql"))
     
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Loading a session's recent turns; existing databases need
+    # CREATE INDEX ix_chat_history_session_created ON chat_history (session_id, created_at)
+    __table_args__ = (
+        Index("ix_chat_history_session_created", "session_id", "created_at"),
+    )
 
 
 class ContentPersonalization(Base):
@@ -57,15 +192,36 @@ class ContentPersonalization(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
-def get_db():
+class ContentVariant(Base):
+    """Personalized or translated rewrite of a page, shared by every user in a profile tier."""
+    __tablename__ = "content_variants"
+    __table_args__ = (
+        UniqueConstraint("content_hash", "profile_tier", "language", name="uq_content_variant"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), nullable=False)  # hash of the text the variant was generated from
+    profile_tier = Column(String(50), nullable=False)  # software:hardware experience, or "any"
+    language = Column(String(10), nullable=False)  # en, ur
+    page_path = Column(String(500))  # set by the pre-generation job only
+    
+    content = Column(Text, nullable=False)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+async def get_db():
     """Dependency for getting database session."""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def init_db():
+async def init_db():
     """Initialize database tables."""
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def close_db():
+    """Close pooled connections on shutdown."""
+    await engine.dispose()
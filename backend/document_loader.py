@@ -0,0 +1,129 @@
+"""
+Markdown/MDX loading for content ingestion.
+
+Discovers pages under docs/, strips frontmatter and MDX/JSX syntax, and
+chunks them with the structural chunker. Nothing here imports the
+services, so load_document can run in worker processes.
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterator
+
+from chunker import chunk_markdown
+from config import settings
+
+DOC_EXTENSIONS = ('.md', '.mdx')
+
+FRONTMATTER_RE = re.compile(r'^---\n.*?\n---\n', re.DOTALL)
+FENCED_CODE_RE = re.compile(r'^(```|~~~).*?^\1[ \t]*$', re.DOTALL | re.MULTILINE)
+MDX_ESM_RE = re.compile(r'^(import|export)\s.*$', re.MULTILINE)
+MDX_COMMENT_RE = re.compile(r'\{/\*.*?\*/\}', re.DOTALL)
+HTML_COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+INLINE_CODE_RE = re.compile(r'(`+)(?!`).+?(?<!`)\1(?!`)')
+# HTML tags that show up in docs pages; other lowercase "<x ...>" is prose (x<y, 3 > 2)
+HTML_TAGS = (
+    'a', 'abbr', 'b', 'br', 'center', 'code', 'details', 'div', 'em', 'figcaption', 'figure',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'iframe', 'img', 'kbd', 'li', 'ol', 'p',
+    'pre', 'section', 'small', 'source', 'span', 'strong', 'sub', 'summary', 'sup', 'table',
+    'tbody', 'td', 'th', 'thead', 'tr', 'u', 'ul', 'video'
+)
+TAG_NAME = r'(?:[A-Z][\w.]*|(?:' + '|'.join(HTML_TAGS) + r'))'
+# JSX components (capitalized), known HTML tags and fragments. Opening tags
+# must not be glued to a preceding word, as C++ templates are (vector<Point>)
+JSX_TAG_RE = re.compile(
+    r'</' + TAG_NAME + r'\s*>|(?<![\w:])<' + TAG_NAME + r'(?=[\s/>])(\s[^<>]*?)?/?>|</?>'
+)
+BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+
+def discover_files(docs_path: Path) -> Iterator[Path]:
+    """Yield every .md/.mdx page under docs_path, in a stable order."""
+    for root, dirs, files in os.walk(docs_path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(DOC_EXTENSIONS):
+                yield Path(root) / name
+
+
+def strip_mdx(content: str) -> str:
+    """Remove MDX imports/exports, JSX tags and comments outside fenced and inline code."""
+    parts = []
+    position = 0
+    for match in FENCED_CODE_RE.finditer(content):
+        parts.append(_strip_mdx_prose(content[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(_strip_mdx_prose(content[position:]))
+    return BLANK_LINES_RE.sub('\n\n', ''.join(parts))
+
+
+def _strip_mdx_prose(text: str) -> str:
+    text = MDX_ESM_RE.sub('', text)
+    text = MDX_COMMENT_RE.sub('', text)
+    text = HTML_COMMENT_RE.sub('', text)
+    # Inline code spans are kept verbatim, like fenced blocks
+    parts = []
+    position = 0
+    for match in INLINE_CODE_RE.finditer(text):
+        parts.append(JSX_TAG_RE.sub('', text[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(JSX_TAG_RE.sub('', text[position:]))
+    return ''.join(parts)
+
+
+def extract_metadata(content: str, filepath: str) -> dict:
+    """Extract metadata from markdown frontmatter."""
+    metadata = {
+        'source': filepath,
+        'title': os.path.splitext(os.path.basename(filepath))[0].replace('-', ' ').title()
+    }
+    
+    # Extract frontmatter
+    frontmatter_match = re.match(r'^---\n(.*?)\n---', content, re.DOTALL)
+    if frontmatter_match:
+        frontmatter = frontmatter_match.group(1)
+        for line in frontmatter.split('\n'):
+            if ':' in line:
+                key, value = line.split(':', 1)
+                metadata[key.strip()] = value.strip()
+    
+    return metadata
+
+
+def content_hash(text: str) -> str:
+    """Short content hash used in point ids and the manifest."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def load_document(path: str, source: str) -> Dict:
+    """
+    Read, clean and chunk one page.
+    Returns {"source", "sha256", "metadata", "chunks": [{"text", "heading_path", "hash"}, ...]}.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    metadata = extract_metadata(content, source)
+    body = FRONTMATTER_RE.sub('', content, count=1)
+    if path.endswith('.mdx'):
+        body = strip_mdx(body)
+    
+    chunks = chunk_markdown(body, settings.chunk_max_tokens, settings.chunk_min_tokens)
+    return {
+        'source': source,
+        'sha256': content_hash(content),
+        'metadata': metadata,
+        'chunks': [
+            {
+                'text': chunk['text'],
+                'heading_path': chunk['heading_path'],
+                # The heading path is part of the chunk's identity
+                'hash': content_hash(' > '.join(chunk['heading_path']) + '\n' + chunk['text'])
+            }
+            for chunk in chunks
+        ]
+    }
@@ -0,0 +1,266 @@
+"""
+Content-addressed embedding cache.
+
+Embeddings are keyed by sha256(model, text), so identical strings (repeated
+questions, unchanged chunks, popular highlighted passages) are embedded once.
+The default cache is tiered: an in-process LRU in front of a SQLite file.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from config import settings
+
+
+def make_key(model: str, text: str) -> str:
+    """Content address for an embedding."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Cache interface. The base class caches nothing."""
+    
+    name = "none"
+    
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+    
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings; missing entries are returned as None."""
+        self.misses += len(keys)
+        return [None] * len(keys)
+    
+    def put_many(self, items: Dict[str, List[float]], hot: bool = True):
+        """Store embeddings by key. Cold items (bulk ingestion) are kept out of process memory."""
+    
+    def clear(self):
+        """Drop every cached embedding."""
+    
+    def __len__(self) -> int:
+        return 0
+    
+    def _record(self, found: List[Optional[List[float]]]):
+        hit_count = sum(1 for vector in found if vector is not None)
+        self.hits += hit_count
+        self.misses += len(found) - hit_count
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class LRUEmbeddingCache(EmbeddingCache):
+    """In-process LRU cache of packed float32 vectors, bounded by their total size."""
+    
+    name = "memory"
+    
+    def __init__(self, max_bytes: int):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._bytes = 0
+        # A 1536-d vector is 6 KB packed, against ~50 KB as a list of Python floats
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        found = []
+        with self._lock:
+            for key in keys:
+                packed = self._entries.get(key)
+                if packed is not None:
+                    self._entries.move_to_end(key)
+                found.append(packed)
+        found = [array("f", packed).tolist() if packed is not None else None for packed in found]
+        self._record(found)
+        return found
+    
+    def put_many(self, items: Dict[str, List[float]], hot: bool = True):
+        if not hot:
+            return
+        packed_items = {key: array("f", vector).tobytes() for key, vector in items.items()}
+        with self._lock:
+            for key, packed in packed_items.items():
+                previous = self._entries.pop(key, None)
+                if previous is not None:
+                    self._bytes -= len(previous)
+                self._entries[key] = packed
+                self._bytes += len(packed)
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict:
+        return {**super().stats(), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+class SQLiteEmbeddingCache(EmbeddingCache):
+    """On-disk cache storing float32 vectors in SQLite, bounded by file size.
+    
+    When the stored vectors exceed max_bytes, the least recently used 10% of
+    the budget is evicted in one statement.
+    """
+    
+    name = "sqlite"
+    
+    def __init__(self, path: str, max_bytes: int):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+    
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for offset in range(0, len(keys), 500):
+                chunk = keys[offset:offset + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+        result = [found.get(key) for key in keys]
+        self._record(result)
+        return result
+    
+    def put_many(self, items: Dict[str, List[float]], hot: bool = True):
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._conn.execute("COMMIT")
+            self._bytes += sum(len(row[1]) for row in rows)
+            if self._bytes > self.max_bytes:
+                self._evict()
+    
+    def _evict(self):
+        """Drop least recently used vectors until 90% of the budget is free."""
+        target = int(self.max_bytes * 0.9)
+        self._bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        if self._bytes <= target:
+            return
+        entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        average = self._bytes / entries
+        evict_count = int((self._bytes - target) / average) + 1
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (evict_count,)
+        )
+        self._bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+    
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._bytes = 0
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    
+    def stats(self) -> Dict:
+        return {**super().stats(), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+class TieredEmbeddingCache(EmbeddingCache):
+    """Memory LRU in front of a persistent tier; disk hits are promoted."""
+    
+    name = "tiered"
+    
+    def __init__(self, memory: EmbeddingCache, disk: EmbeddingCache):
+        super().__init__()
+        self.memory = memory
+        self.disk = disk
+    
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        found = self.memory.get_many(keys)
+        missing = [key for key, vector in zip(keys, found) if vector is None]
+        if missing:
+            from_disk = dict(zip(missing, self.disk.get_many(missing)))
+            promoted = {key: vector for key, vector in from_disk.items() if vector is not None}
+            self.memory.put_many(promoted)
+            found = [vector if vector is not None else from_disk.get(key) for key, vector in zip(keys, found)]
+        self._record(found)
+        return found
+    
+    def put_many(self, items: Dict[str, List[float]], hot: bool = True):
+        self.memory.put_many(items, hot)
+        self.disk.put_many(items, hot)
+    
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
+    
+    def __len__(self) -> int:
+        return len(self.disk)
+    
+    def stats(self) -> Dict:
+        return {**super().stats(), "memory": self.memory.stats(), "disk": self.disk.stats()}
+
+
+def create_embedding_cache() -> EmbeddingCache:
+    """Build the embedding cache selected by settings.embedding_cache_backend."""
+    backend = settings.embedding_cache_backend
+    if backend == "none":
+        return EmbeddingCache()
+    memory = LRUEmbeddingCache(settings.embedding_cache_max_memory_mb * 1024 * 1024)
+    if backend == "memory":
+        return memory
+    if backend == "sqlite":
+        disk = SQLiteEmbeddingCache(
+            settings.embedding_cache_path,
+            settings.embedding_cache_max_disk_mb * 1024 * 1024
+        )
+        return TieredEmbeddingCache(memory, disk)
+    raise ValueError(f"Unknown embedding cache backend: {backend}")
@@ -0,0 +1,110 @@
+"""
+Pluggable embedding backends.
+
+`openai` calls the OpenAI embeddings API. `local` keeps a sentence-transformers
+model (PyTorch or ONNX runtime) loaded in-process and encodes batches on a
+small thread pool, so query embeddings take milliseconds and ingestion
+works offline.
+"""
+
+import asyncio
+import re
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from openai import AsyncOpenAI
+
+from config import settings
+from metrics import record_usage
+from tokens import count_tokens
+from upstream import embedding_upstream
+
+
+class EmbeddingBackend(ABC):
+    """Interface: a model name (for cache keys), a dimension and batch encoding."""
+    
+    name = "base"
+    model: str
+    dimension: int
+    
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """One embedding per text, in order."""
+    
+    @property
+    def slug(self) -> str:
+        """Model name usable in collection names."""
+        return re.sub(r"[^a-z0-9]+", "-", self.model.lower()).strip("-")
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """Embeddings from the OpenAI API."""
+    
+    name = "openai"
+    
+    def __init__(self):
+        self.model = settings.embedding_model
+        self.dimension = settings.embedding_dimension
+        # Retries happen in the upstream scheduler
+        self.client = AsyncOpenAI(
+            api_key=settings.openai_api_key, base_url=settings.openai_base_url, max_retries=0
+        )
+    
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        response = await embedding_upstream.call(
+            "embedding",
+            lambda: self.client.embeddings.create(
+                model=self.model,
+                input=texts
+            ),
+            tokens=sum(count_tokens(text, self.model) for text in texts)
+        )
+        record_usage("embedding", response.usage)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """CPU sentence-transformers model kept loaded in-process."""
+    
+    name = "local"
+    
+    def __init__(self):
+        # Optional dependency, only needed for this backend
+        from sentence_transformers import SentenceTransformer
+        
+        self.model = settings.local_embedding_model
+        self.batch_size = settings.local_embedding_batch_size
+        self._model = SentenceTransformer(
+            self.model,
+            device="cpu",
+            backend=settings.local_embedding_runtime
+        )
+        self.dimension = self._model.get_sentence_embedding_dimension()
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.local_embedding_threads,
+            thread_name_prefix="embedding"
+        )
+    
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+    
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._encode, texts)
+
+
+def create_embedding_backend() -> EmbeddingBackend:
+    """Build the embedding backend selected by settings.embedding_backend."""
+    if settings.embedding_backend == "openai":
+        return OpenAIEmbeddingBackend()
+    if settings.embedding_backend == "local":
+        return SentenceTransformerBackend()
+    raise ValueError(f"Unknown embedding backend: {settings.embedding_backend}")
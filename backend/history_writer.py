@@ -0,0 +1,132 @@
+"""
+Background writer for chat history.
+
+Chat endpoints hand finished turns to the writer and return straight away;
+a single task drains the queue and inserts rows in bulk once a batch is
+full or the flush interval has passed since its first record.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+
+from config import settings
+from database import SessionLocal, ChatHistory
+from metrics import stage
+
+
+class ChatHistoryWriter:
+    """Bounded queue of chat_history rows flushed by one background task."""
+    
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+    
+    def start(self):
+        """Start the flush task on the running event loop."""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Flush everything queued so far and stop the flush task."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+    
+    def write(
+        self,
+        user_id: Optional[int],
+        session_id: str,
+        question: str,
+        answer: str,
+        sources: List[Dict]
+    ):
+        """Queue a chat turn. Never waits; drops the row if the queue is full."""
+        record = {
+            "user_id": user_id,
+            "session_id": session_id,
+            "question": question,
+            "answer": answer,
+            "context_used": sources,
+            "created_at": datetime.utcnow()
+        }
+        if self._task is None:
+            self.dropped += 1
+            print("Chat history writer is not running; dropped a chat turn")
+            return
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print("Chat history queue is full; dropped a chat turn")
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            record = await self._queue.get()
+            if record is None:
+                break
+            batch = [record]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            await self._flush(batch)
+        
+        # Anything queued behind the stop marker
+        remaining = []
+        while not self._queue.empty():
+            record = self._queue.get_nowait()
+            if record is not None:
+                remaining.append(record)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+    
+    async def _flush(self, batch: List[Dict]):
+        try:
+            with stage("history_flush"):
+                async with SessionLocal() as db:
+                    await db.execute(insert(ChatHistory), batch)
+                    await db.commit()
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Failed to write {len(batch)} chat history rows: {e}")
+    
+    def stats(self) -> Dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+
+history_writer = ChatHistoryWriter(
+    max_queue=settings.history_queue_size,
+    batch_size=settings.history_batch_size,
+    flush_interval=settings.history_flush_interval
+)
@@ -1,108 +1,229 @@
 """
 Content ingestion script for RAG chatbot.
-Reads markdown files from docs/ and ingests them into Qdrant.
+Reads markdown and MDX files from docs/ and ingests them into Qdrant.
+
+Runs incrementally by default: a manifest of file hashes, mtimes and point
+ids lets a docs edit re-embed only the chunks that changed. Changing the
+chunker or CHUNK_MAX_TOKENS/CHUNK_MIN_TOKENS re-chunks every file, which
+still re-embeds only the chunks that came out different. Use --full to
+re-embed everything and --rebuild to start from an empty collection.
+Running API servers notice the new collection version (see
+QdrantService.collection_version) and drop their cached answers.
 """
 
+import argparse
+import asyncio
+import json
 import os
-import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from chunker import CHUNKER_VERSION
+from config import settings
+from document_loader import discover_files, load_document
 from qdrant_service import qdrant_service
 
+DEFAULT_MANIFEST_PATH = '.cache/ingest_manifest.json'
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> list[str]:
-    """Split text into overlapping chunks."""
-    chunks = []
-    start = 0
-    
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        
-        # Try to end at a sentence boundary
-        if end < len(text):
-            last_period = chunk.rfind('.')
-            last_newline = chunk.rfind('\n\n')
-            boundary = max(last_period, last_newline)
-            
-            if boundary > chunk_size // 2:
-                chunk = chunk[:boundary + 1]
-                end = start + boundary + 1
-        
-        chunks.append(chunk.strip())
-        start = end - overlap
-    
-    return chunks
+
+def load_manifest(manifest_path: str) -> dict:
+    """Load the ingestion manifest (file hashes, mtimes and point ids)."""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'collection': None, 'files': {}}
 
 
-def extract_metadata(content: str, filepath: str) -> dict:
-    """Extract metadata from markdown frontmatter."""
-    metadata = {
-        'source': filepath,
-        'title': os.path.basename(filepath).replace('.md', '').replace('-', ' ').title()
+def save_manifest(manifest: dict, manifest_path: str):
+    """Atomically write the ingestion manifest."""
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def chunker_settings() -> Dict:
+    """Everything that decides chunk boundaries; files chunked under other settings are re-chunked."""
+    return {
+        'version': CHUNKER_VERSION,
+        'max_tokens': settings.chunk_max_tokens,
+        'min_tokens': settings.chunk_min_tokens
     }
-    
-    # Extract frontmatter
-    frontmatter_match = re.match(r'^---\n(.*?)\n---', content, re.DOTALL)
-    if frontmatter_match:
-        frontmatter = frontmatter_match.group(1)
-        for line in frontmatter.split('\n'):
-            if ':' in line:
-                key, value = line.split(':', 1)
-                metadata[key.strip()] = value.strip()
-    
-    return metadata
 
 
-def ingest_markdown_files(docs_dir: str = '../docs'):
-    """Ingest all markdown files from docs directory."""
+async def _load(pool: ProcessPoolExecutor, path: Path, source: str, mtime: float) -> Tuple[Dict, float]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, load_document, str(path), source), mtime
+
+
+async def ingest_markdown_files(
+    docs_dir: str = '../docs',
+    incremental: bool = True,
+    rebuild: bool = False,
+    manifest_path: str = DEFAULT_MANIFEST_PATH,
+    workers: Optional[int] = None,
+    build_local_index: bool = settings.local_index_enabled
+):
+    """
+    Ingest all markdown and MDX files from docs directory.
+    
+    Files are parsed and chunked in a process pool and their new chunks flow
+    through a bounded queue into the batched embedder/upserter, so memory
+    stays flat regardless of corpus size.
+    
+    Point ids are derived from (source path, chunk index, chunk hash), so
+    re-ingesting is idempotent. In incremental mode, files whose mtime or
+    hash match the manifest are skipped, only new chunks are embedded, and
+    points for removed chunks and files are deleted.
+    
+    With build_local_index, the collection is then snapshotted into the
+    memory-mapped index served in-process by QdrantService.
+    """
     docs_path = Path(docs_dir)
     
     if not docs_path.exists():
         print(f"Error: {docs_dir} does not exist")
         return
     
-    # Collect all markdown files
-    md_files = list(docs_path.rglob('*.md'))
-    print(f"Found {len(md_files)} markdown files")
+    if rebuild:
+        await qdrant_service.delete_collection()
+    created = await qdrant_service.create_collection()
     
-    all_documents = []
+    manifest = load_manifest(manifest_path)
+    if created or manifest.get('collection') != qdrant_service.collection_name:
+        # The manifest describes some other collection; nothing in it is valid here
+        manifest = {'collection': qdrant_service.collection_name, 'files': {}}
+    previous_files = manifest['files']
+    rechunk = bool(previous_files) and manifest.get('chunker') != chunker_settings()
+    if rechunk:
+        print("Chunker settings changed; re-chunking every file")
+    # Files unchanged since the last run can be skipped without loading them
+    skip_unchanged = incremental and not rechunk
     
-    for md_file in md_files:
-        print(f"Processing: {md_file}")
-        
-        with open(md_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Extract metadata
-        metadata = extract_metadata(content, str(md_file.relative_to(docs_path)))
-        
-        # Remove frontmatter from content
-        content = re.sub(r'^---\n.*?\n---\n', '', content, flags=re.DOTALL)
-        
-        # Chunk the content
-        chunks = chunk_text(content)
+    workers = workers or os.cpu_count() or 1
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.embedding_batch_size * settings.embedding_max_concurrency)
+    files = {}
+    stale_ids = []
+    payload_updates = []
+    counts = {'files': 0, 'changed': 0, 'chunks': 0}
+    
+    async def handle(doc: Dict, mtime: float):
+        source = doc['source']
+        previous = previous_files.get(source)
+        if skip_unchanged and previous and previous['sha256'] == doc['sha256']:
+            files[source] = {**previous, 'mtime': mtime}
+            return
         
-        # Create documents
+        print(f"Processing: {source}")
+        counts['changed'] += 1
+        chunks = doc['chunks']
+        old_ids = set(previous['chunks']) if previous and incremental else set()
+        ids = []
+        kept_ids = []
         for i, chunk in enumerate(chunks):
-            doc = {
-                'text': chunk,
+            point_id = qdrant_service.point_id(source, i, chunk['hash'])
+            ids.append(point_id)
+            if point_id in old_ids:
+                kept_ids.append(point_id)
+                continue
+            counts['chunks'] += 1
+            # Blocks while the embedder is behind
+            await queue.put({
+                'id': point_id,
+                'text': chunk['text'],
                 'metadata': {
-                    **metadata,
+                    **doc['metadata'],
+                    'heading_path': chunk['heading_path'],
                     'chunk_index': i,
                     'total_chunks': len(chunks)
                 }
-            }
-            all_documents.append(doc)
+            })
+        
+        if kept_ids:
+            # Unchanged chunks keep their vectors; refresh file-level metadata only
+            payload_updates.append((kept_ids, {**doc['metadata'], 'total_chunks': len(chunks)}))
+        if previous:
+            stale_ids.extend(set(previous['chunks']) - set(ids))
+        files[source] = {'sha256': doc['sha256'], 'mtime': mtime, 'chunks': ids}
+    
+    async def produce():
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for path in discover_files(docs_path):
+                counts['files'] += 1
+                source = str(path.relative_to(docs_path))
+                mtime = path.stat().st_mtime
+                previous = previous_files.get(source)
+                if skip_unchanged and previous and previous['mtime'] == mtime:
+                    files[source] = previous
+                    continue
+                if len(pending) >= workers * 2:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        await handle(*task.result())
+                pending.add(asyncio.create_task(_load(pool, path, source, mtime)))
+            for task in asyncio.as_completed(pending):
+                await handle(*await task)
+        await queue.put(None)
     
-    print(f"\nTotal chunks created: {len(all_documents)}")
+    async def drain():
+        while True:
+            doc = await queue.get()
+            if doc is None:
+                return
+            yield doc
     
     # Ingest into Qdrant
-    print("Ingesting into Qdrant...")
-    qdrant_service.create_collection()
-    qdrant_service.add_documents(all_documents)
+    print(f"Ingesting {docs_dir} with {workers} loader processes...")
+    producer = asyncio.create_task(produce())
+    consumer = asyncio.create_task(qdrant_service.add_documents(drain()))
+    try:
+        await asyncio.gather(producer, consumer)
+    finally:
+        producer.cancel()
+        consumer.cancel()
+    
+    for source, previous in previous_files.items():
+        if source not in files:
+            print(f"Removed: {source}")
+            stale_ids.extend(previous['chunks'])
+    
+    print(f"\nFiles: {counts['files']} found, {counts['changed']} changed; "
+          f"chunks embedded: {counts['chunks']}, stale chunks deleted: {len(stale_ids)}")
+    
+    if stale_ids:
+        await qdrant_service.delete_points(stale_ids)
+    for kept_ids, payload in payload_updates:
+        await qdrant_service.set_payload(kept_ids, payload)
+    
+    manifest['files'] = files
+    manifest['chunker'] = chunker_settings()
+    save_manifest(manifest, manifest_path)
+    
+    if build_local_index:
+        await qdrant_service.build_local_index()
     
     print("✅ Ingestion complete!")
 
 
 if __name__ == '__main__':
-    ingest_markdown_files()
+    parser = argparse.ArgumentParser(description="Ingest docs/ into Qdrant")
+    parser.add_argument('--docs-dir', default='../docs')
+    parser.add_argument('--full', action='store_true', help="re-embed every chunk, ignoring the manifest")
+    parser.add_argument('--rebuild', action='store_true', help="drop and recreate the collection first")
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH)
+    parser.add_argument('--workers', type=int, default=None, help="loader processes (default: CPU count)")
+    parser.add_argument('--local-index', action='store_true', default=settings.local_index_enabled,
+                        help="rebuild the in-process vector index afterwards")
+    args = parser.parse_args()
+    asyncio.run(ingest_markdown_files(
+        docs_dir=args.docs_dir,
+        incremental=not args.full,
+        rebuild=args.rebuild,
+        manifest_path=args.manifest,
+        workers=args.workers,
+        build_local_index=args.local_index
+    ))
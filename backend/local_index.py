@@ -0,0 +1,197 @@
+"""
+In-process vector index over memory-mapped, quantized embeddings.
+
+The textbook is only a few thousand chunks, so brute-force top-k over an
+int8 (or float16) matrix is both exact enough and faster than a network hop
+to Qdrant. An index directory holds:
+
+    meta.json               current version, dtype, dimension, file names
+    vectors-<version>.npy   L2-normalized vectors, int8 or float16
+    scales-<version>.npy    per-row dequantization scales (int8 only)
+    payloads-<version>.jsonl and offsets-<version>.npy
+                            one JSON payload per line, read lazily by offset
+
+Writers publish a new version by rewriting meta.json last, and readers
+reload when its mtime changes, so a running server picks up a rebuilt
+index without a restart.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Rows scored per block, to bound temporary memory during search
+SEARCH_BLOCK_ROWS = 1024
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def write_index(path: str, points: Iterable[Tuple[List[float], Dict]], dtype: str = "int8") -> Dict:
+    """Write (vector, payload) pairs as a new index version. Returns its metadata."""
+    os.makedirs(path, exist_ok=True)
+    version = uuid.uuid4().hex[:12]
+    payload_file = f"payloads-{version}.jsonl"
+    
+    vectors = []
+    offsets = []
+    position = 0
+    with open(os.path.join(path, payload_file), "wb") as f:
+        for vector, payload in points:
+            vectors.append(vector)
+            line = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+            offsets.append(position)
+            f.write(line)
+            position += len(line)
+    offsets.append(position)
+    
+    matrix = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1))
+    meta = {
+        "version": version,
+        "dtype": dtype,
+        "count": len(vectors),
+        "dimension": int(matrix.shape[1]),
+        "vectors": f"vectors-{version}.npy",
+        "payloads": payload_file,
+        "offsets": f"offsets-{version}.npy",
+        "built_at": time.time()
+    }
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        np.save(os.path.join(path, meta["vectors"]), np.round(matrix / scales[:, None]).astype(np.int8))
+        meta["scales"] = f"scales-{version}.npy"
+        np.save(os.path.join(path, meta["scales"]), scales.astype(np.float32))
+    elif dtype == "float16":
+        np.save(os.path.join(path, meta["vectors"]), matrix.astype(np.float16))
+    else:
+        raise ValueError(f"Unsupported local index dtype: {dtype}")
+    np.save(os.path.join(path, meta["offsets"]), np.asarray(offsets, dtype=np.uint64))
+    
+    meta_path = os.path.join(path, "meta.json")
+    previous = None
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+    
+    # Readers that still map the previous version keep their open file handles
+    if previous:
+        for key in ("vectors", "scales", "payloads", "offsets"):
+            if key in previous:
+                try:
+                    os.remove(os.path.join(path, previous[key]))
+                except OSError:
+                    # Already gone, or still mapped by a reader on Windows
+                    pass
+    return meta
+
+
+class LocalVectorIndex:
+    """Read side: memory-mapped brute-force top-k search with hot reload."""
+    
+    def __init__(self, path: str, reload_interval: float = 1.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.meta: Optional[Dict] = None
+        self._meta_mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._vectors = None
+        self._scales = None
+        self._offsets = None
+        self._payload_file = None
+        self.maybe_reload(force=True)
+    
+    @property
+    def ready(self) -> bool:
+        return self.meta is not None and self.meta["count"] > 0
+    
+    def reload_due(self) -> bool:
+        """Whether maybe_reload would check meta.json now. Cheap enough for the event loop."""
+        return time.monotonic() - self._checked_at >= self.reload_interval
+    
+    def maybe_reload(self, force: bool = False):
+        """
+        Reload if meta.json changed (checked at most once per reload_interval).
+        Blocking: async callers should run it in a thread. The new version is
+        loaded before taking the search lock, so searches only wait for the swap.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            # Another thread is already checking
+            return
+        try:
+            now = time.monotonic()
+            if not force and now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            meta_path = os.path.join(self.path, "meta.json")
+            try:
+                mtime = os.stat(meta_path).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime == self._meta_mtime:
+                return
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            vectors = np.load(os.path.join(self.path, meta["vectors"]), mmap_mode="r")
+            scales = np.load(os.path.join(self.path, meta["scales"])) if "scales" in meta else None
+            offsets = np.load(os.path.join(self.path, meta["offsets"]))
+            payload_file = open(os.path.join(self.path, meta["payloads"]), "rb")
+            with self._lock:
+                previous_file = self._payload_file
+                self.meta, self._meta_mtime = meta, mtime
+                self._vectors, self._scales, self._offsets, self._payload_file = vectors, scales, offsets, payload_file
+            if previous_file:
+                previous_file.close()
+            print(f"Loaded local index {meta['version']} ({meta['count']} vectors, {meta['dtype']})")
+        finally:
+            self._reload_lock.release()
+    
+    def _payload(self, row: int) -> Dict:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        self._payload_file.seek(start)
+        return json.loads(self._payload_file.read(end - start))
+    
+    def search(self, query_embedding: List[float], limit: int = 5) -> List[Dict]:
+        """Exact top-k by cosine similarity."""
+        return self.search_many([query_embedding], limit)[0]
+    
+    def search_many(self, query_embeddings: List[List[float]], limit: int = 5) -> List[List[Dict]]:
+        """Exact top-k for several queries in one pass over the matrix."""
+        with self._lock:
+            queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+            count = self._vectors.shape[0]
+            scores = np.empty((len(queries), count), dtype=np.float32)
+            for start in range(0, count, SEARCH_BLOCK_ROWS):
+                block = np.asarray(self._vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+                scores[:, start:start + len(block)] = queries @ block.T
+            if self._scales is not None:
+                scores *= self._scales
+            
+            k = min(limit, count)
+            results = []
+            for row_scores in scores:
+                top = np.argpartition(-row_scores, k - 1)[:k]
+                top = top[np.argsort(-row_scores[top])]
+                hits = []
+                for row in top:
+                    payload = self._payload(int(row))
+                    hits.append({
+                        "text": payload["text"],
+                        "score": float(row_scores[row]),
+                        "metadata": {key: value for key, value in payload.items() if key != "text"}
+                    })
+                results.append(hits)
+            return results
@@ -1,21 +1,50 @@
 from fastapi import FastAPI, Depends, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
+from contextlib import aclosing, asynccontextmanager
+import asyncio
+import json
+import math
 import uuid
 
 from config import settings
-from database import get_db, init_db, User, ChatHistory, ContentPersonalization
+from database import get_db, init_db, close_db, pool_stats, User
 from auth_service import auth_service
-from rag_service import rag_service
+from rag_service import rag_service, profile_tier
+from content_cache import content_cache, ANY_TIER
+from history_writer import history_writer
+from profile_cache import profile_cache, user_profile
+from password_hashing import HashingPoolBusy, password_hasher
+from metrics import REGISTRY, MetricsMiddleware
 from qdrant_service import qdrant_service
+from upstream import UpstreamBusy, chat_upstream, embedding_upstream
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize database and Qdrant on startup; flush and close them on shutdown."""
+    await init_db()
+    await qdrant_service.create_collection()
+    history_writer.start()
+    print("[OK] Database and Qdrant initialized")
+    try:
+        yield
+    finally:
+        # Queued chat history needs the database, so it goes first
+        await history_writer.stop()
+        await qdrant_service.close()
+        await close_db()
+        print("[OK] Database and Qdrant connections closed")
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Physical AI Textbook API",
     description="Backend API for Physical AI & Humanoid Robotics Textbook",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -25,7 +54,94 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
+)
+app.add_middleware(MetricsMiddleware)
+
+
+def cache_lookups():
+    """Hit/miss counters the caches already keep, read at scrape time."""
+    embedding_cache = qdrant_service.embedding_cache
+    answer_cache = rag_service.answer_cache
+    return {
+        ("embedding", "hit"): embedding_cache.hits,
+        ("embedding", "miss"): embedding_cache.misses,
+        ("answer", "hit"): answer_cache.hits,
+        ("answer", "miss"): answer_cache.misses,
+        ("content", "hit"): content_cache.memory_hits + content_cache.db_hits,
+        ("content", "miss"): content_cache.misses,
+        ("profile", "hit"): profile_cache.hits,
+        ("profile", "miss"): profile_cache.misses,
+        ("conversation", "hit"): rag_service.conversations.hits,
+        ("conversation", "miss"): rag_service.conversations.loads
+    }
+
+
+REGISTRY.callback("cache_lookups_total", "Cache lookups by cache and result.", "counter", ("cache", "result"), cache_lookups)
+REGISTRY.callback(
+    "db_pool_connections", "Database pool connections by state.", "gauge", ("state",),
+    lambda: {(key,): value for key, value in pool_stats().items() if key in ("size", "checked_out", "overflow")}
+)
+REGISTRY.callback(
+    "chat_history_queue_depth", "Chat turns waiting to be written.", "gauge", (),
+    lambda: {(): history_writer.stats()["queued"]}
+)
+REGISTRY.callback(
+    "password_hashes_pending", "bcrypt calls running or queued.", "gauge", (),
+    lambda: {(): password_hasher.pending}
+)
+REGISTRY.callback(
+    "upstream_concurrency_limit", "Adaptive limit on concurrent OpenAI calls.", "gauge", ("upstream",),
+    lambda: {(upstream.name,): upstream.limit for upstream in (chat_upstream, embedding_upstream)}
 )
+REGISTRY.callback(
+    "upstream_in_flight", "OpenAI calls in flight.", "gauge", ("upstream",),
+    lambda: {(upstream.name,): upstream.in_flight for upstream in (chat_upstream, embedding_upstream)}
+)
+REGISTRY.callback(
+    "upstream_queued", "Calls waiting for an OpenAI slot, by priority.", "gauge", ("upstream", "priority"),
+    lambda: {
+        (upstream.name, priority): count
+        for upstream in (chat_upstream, embedding_upstream)
+        for priority, count in upstream.queued().items()
+    }
+)
+REGISTRY.callback(
+    "upstream_shed_total", "Calls rejected after queueing past their deadline.", "counter", ("upstream", "priority"),
+    lambda: {
+        (upstream.name, priority): count
+        for upstream in (chat_upstream, embedding_upstream)
+        for priority, count in upstream.shed.items()
+    }
+)
+REGISTRY.callback(
+    "upstream_throttled_total", "429 responses from OpenAI.", "counter", ("upstream",),
+    lambda: {(upstream.name,): upstream.throttled for upstream in (chat_upstream, embedding_upstream)}
+)
+REGISTRY.callback(
+    "singleflight_coalesced_total", "Requests that joined an identical in-flight LLM call.", "counter", ("operation",),
+    lambda: {(operation,): counts["coalesced"] for operation, counts in rag_service.inflight.stats().items()}
+)
+
+
+@app.exception_handler(HashingPoolBusy)
+async def hashing_pool_busy(request, exc):
+    """Shed signup/login bursts instead of queueing them behind bcrypt."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-ins in progress, please retry shortly"},
+        headers={"Retry-After": "1"}
+    )
+
+
+@app.exception_handler(UpstreamBusy)
+async def upstream_busy(request, exc):
+    """Shed load when calls to the language model have queued past their deadline."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))}
+    )
 
 
 # Pydantic models
@@ -42,12 +158,24 @@ class LoginRequest(BaseModel):
     password: str
 
 
+class ProfileUpdateRequest(BaseModel):
+    name: Optional[str] = None
+    software_experience: Optional[str] = None
+    hardware_experience: Optional[str] = None
+
+
 class ChatRequest(BaseModel):
     question: str
     selected_text: Optional[str] = None
     session_id: Optional[str] = None
 
 
+class BatchChatRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=settings.batch_answer_max_questions)
+    selected_text: Optional[str] = None
+    stream: bool = False
+
+
 class PersonalizeRequest(BaseModel):
     content: str
     page_path: str
@@ -64,9 +192,15 @@ class IngestDocumentsRequest(BaseModel):
 # Dependency to get current user
 async def get_current_user(
     authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Optional[User]:
-    """Get current user from JWT token."""
+    """
+    Get current user from JWT token.
+    
+    The profile is the stored one, served from the profile cache (and
+    reloaded if the token is newer than the cached copy), so tokens issued
+    before a profile update don't bring back the old profile.
+    """
     if not authorization or not authorization.startswith("Bearer "):
         return None
     
@@ -76,17 +210,16 @@ async def get_current_user(
     if not payload:
         return None
     
-    user = auth_service.get_user_by_id(db, payload["user_id"])
-    return user
+    profile = await profile_cache.load(db, payload["user_id"], payload.get("profile_version", 0))
+    return User(**profile) if profile else None
 
 
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database and Qdrant on startup."""
-    init_db()
-    qdrant_service.create_collection()
-    print("[OK] Database and Qdrant initialized")
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics."""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 
 # Health check
@@ -101,15 +234,15 @@ async def root():
 
 # Auth endpoints
 @app.post("/api/auth/signup")
-async def signup(request: SignupRequest, db: Session = Depends(get_db)):
+async def signup(request: SignupRequest, db: AsyncSession = Depends(get_db)):
     """Register a new user."""
     # Check if user exists
-    existing_user = db.query(User).filter(User.email == request.email).first()
+    existing_user = await auth_service.get_user_by_email(db, request.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user
-    user = auth_service.create_user(
+    user = await auth_service.create_user(
         db=db,
         email=request.email,
         name=request.name,
@@ -119,59 +252,75 @@ async def signup(request: SignupRequest, db: Session = Depends(get_db)):
     )
     
     # Generate token
-    token = auth_service.create_access_token(user.id, user.email)
+    token = auth_service.create_access_token(user)
     
     return {
         "message": "User created successfully",
         "token": token,
-        "user": {
-            "id": user.id,
-            "email": user.email,
-            "name": user.name,
-            "software_experience": user.software_experience,
-            "hardware_experience": user.hardware_experience
-        }
+        "user": user_profile(user)
     }
 
 
 @app.post("/api/auth/login")
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
+async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
     """Login user."""
-    user = auth_service.authenticate_user(db, request.email, request.password)
+    user = await auth_service.authenticate_user(db, request.email, request.password)
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    token = auth_service.create_access_token(user.id, user.email)
+    token = auth_service.create_access_token(user)
     
     return {
         "message": "Login successful",
         "token": token,
-        "user": {
-            "id": user.id,
-            "email": user.email,
-            "name": user.name,
-            "software_experience": user.software_experience,
-            "hardware_experience": user.hardware_experience
-        }
+        "user": user_profile(user)
     }
 
 
 @app.get("/api/auth/me")
 async def get_me(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get current user profile."""
+    """Get current user profile, as stored (tokens may carry an older copy)."""
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    profile = await profile_cache.load(db, current_user.id)
+    if not profile:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    return profile
+
+
+@app.put("/api/auth/profile")
+async def update_profile(
+    request: ProfileUpdateRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Update the current user's profile and issue a token carrying it."""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    user = await auth_service.update_profile(
+        db,
+        current_user.id,
+        name=request.name,
+        software_experience=request.software_experience,
+        hardware_experience=request.hardware_experience
+    )
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    # Replaces any cached copy; other processes reload theirs when they see the new token
+    profile_cache.put(user)
+    
     return {
-        "id": current_user.id,
-        "email": current_user.email,
-        "name": current_user.name,
-        "software_experience": current_user.software_experience,
-        "hardware_experience": current_user.hardware_experience
+        "message": "Profile updated",
+        "token": auth_service.create_access_token(user),
+        "user": user_profile(user)
     }
 
 
@@ -179,7 +328,6 @@ async def get_me(
 @app.post("/api/chat")
 async def chat(
     request: ChatRequest,
-    db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user)
 ):
     """Chat with RAG bot."""
@@ -192,24 +340,28 @@ async def chat(
             "hardware_experience": current_user.hardware_experience
         }
     
+    # Earlier turns of the conversation, if the client is continuing one
+    user_id = current_user.id if current_user else None
+    history = await rag_service.conversations.history(request.session_id, user_id) if request.session_id else None
+    
     # Generate answer
-    result = rag_service.answer_question(
+    result = await rag_service.answer_question(
         question=request.question,
         selected_text=request.selected_text,
-        user_profile=user_profile
+        user_profile=user_profile,
+        history=history
     )
     
-    # Save to chat history
+    # Save to chat history (written in the background)
     session_id = request.session_id or str(uuid.uuid4())
-    chat_history = ChatHistory(
-        user_id=current_user.id if current_user else None,
+    rag_service.conversations.append(session_id, user_id, request.question, result["answer"])
+    history_writer.write(
+        user_id=user_id,
         session_id=session_id,
         question=request.question,
         answer=result["answer"],
-        context_used=str(result["sources"])
+        sources=result["sources"]
     )
-    db.add(chat_history)
-    db.commit()
     
     return {
         "answer": result["answer"],
@@ -218,11 +370,124 @@ async def chat(
     }
 
 
+def format_sse(event: str, data) -> str:
+    """Encode one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    current_user: Optional[User] = Depends(get_current_user)
+):
+    """
+    Chat with RAG bot, streaming the response as server-sent events:
+    `session`, then `sources`, then one `token` event per chunk, then `done`
+    (or `error` if answering fails, e.g. because the language model is too busy).
+    The chat history row is written when the stream finishes or is cancelled.
+    """
+    
+    user_profile = None
+    if current_user:
+        user_profile = {
+            "software_experience": current_user.software_experience,
+            "hardware_experience": current_user.hardware_experience
+        }
+    user_id = current_user.id if current_user else None
+    session_id = request.session_id or str(uuid.uuid4())
+    
+    async def event_stream():
+        sources = []
+        parts = []
+        try:
+            yield format_sse("session", {"session_id": session_id})
+            history = await rag_service.conversations.history(request.session_id, user_id) if request.session_id else None
+            async with aclosing(rag_service.stream_answer(
+                question=request.question,
+                selected_text=request.selected_text,
+                user_profile=user_profile,
+                history=history
+            )) as events:
+                async for event in events:
+                    if event["type"] == "sources":
+                        sources = event["sources"]
+                        yield format_sse("sources", {"sources": sources})
+                    else:
+                        parts.append(event["content"])
+                        yield format_sse("token", {"content": event["content"]})
+            yield format_sse("done", {"session_id": session_id})
+        except UpstreamBusy as e:
+            # Headers are already sent, so report it in the stream instead of as a 503
+            yield format_sse("error", {"detail": str(e), "retry_after": math.ceil(e.retry_after)})
+        except Exception as e:
+            print(f"Chat stream failed: {e!r}")
+            yield format_sse("error", {"detail": "Sorry, something went wrong while answering. Please try again."})
+        finally:
+            if parts:
+                rag_service.conversations.append(session_id, user_id, request.question, "".join(parts))
+                history_writer.write(user_id, session_id, request.question, "".join(parts), sources)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/chat/batch")
+async def chat_batch(
+    request: BatchChatRequest,
+    current_user: Optional[User] = Depends(get_current_user)
+):
+    """
+    Draft answers for many questions at once.
+    Returns {"results": [...]} in question order, or with stream=true an
+    NDJSON stream of {"index", "question", "answer", "sources"} lines in
+    completion order. A question that could not be answered has answer
+    null and an "error" message; the rest are still answered.
+    """
+    
+    user_profile = None
+    if current_user:
+        user_profile = {
+            "software_experience": current_user.software_experience,
+            "hardware_experience": current_user.hardware_experience
+        }
+    
+    if not request.stream:
+        results = await rag_service.answer_questions(
+            request.questions,
+            selected_text=request.selected_text,
+            user_profile=user_profile
+        )
+        return {
+            "results": [
+                {"question": question, **result}
+                for question, result in zip(request.questions, results)
+            ]
+        }
+    
+    async def result_stream():
+        async with aclosing(rag_service.stream_answer_questions(
+            request.questions,
+            selected_text=request.selected_text,
+            user_profile=user_profile
+        )) as results:
+            async for index, result in results:
+                yield json.dumps({
+                    "index": index,
+                    "question": request.questions[index],
+                    **result
+                }) + "\n"
+    
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
 # Content personalization
 @app.post("/api/personalize")
 async def personalize_content(
     request: PersonalizeRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Personalize content for user."""
@@ -234,27 +499,28 @@ async def personalize_content(
         "hardware_experience": current_user.hardware_experience
     }
     
-    personalized = rag_service.personalize_content(request.content, user_profile)
-    
-    # Save personalization
-    personalization = ContentPersonalization(
-        user_id=current_user.id,
-        page_path=request.page_path,
-        original_content=request.content,
-        personalized_content=personalized,
-        language="en"
+    personalized = await content_cache.get_or_generate(
+        db,
+        content=request.content,
+        profile_tier=profile_tier(user_profile),
+        language="en",
+        generate=lambda: rag_service.personalize_content(request.content, user_profile)
     )
-    db.add(personalization)
-    db.commit()
     
     return {"personalized_content": personalized}
 
 
 # Translation
 @app.post("/api/translate")
-async def translate_content(request: TranslateRequest):
+async def translate_content(request: TranslateRequest, db: AsyncSession = Depends(get_db)):
     """Translate content to Urdu."""
-    translated = rag_service.translate_to_urdu(request.content)
+    translated = await content_cache.get_or_generate(
+        db,
+        content=request.content,
+        profile_tier=ANY_TIER,
+        language="ur",
+        generate=lambda: rag_service.translate_to_urdu(request.content)
+    )
     return {"translated_content": translated}
 
 
@@ -262,10 +528,30 @@ async def translate_content(request: TranslateRequest):
 @app.post("/api/admin/ingest")
 async def ingest_documents(request: IngestDocumentsRequest):
     """Ingest documents into Qdrant (admin only)."""
-    qdrant_service.add_documents(request.documents)
+    stats = await qdrant_service.add_documents(request.documents)
     return {
         "message": f"Successfully ingested {len(request.documents)} documents",
-        "count": len(request.documents)
+        "count": len(request.documents),
+        "stats": stats
+    }
+
+
+@app.get("/api/admin/cache-stats")
+async def cache_stats():
+    """Report cache hit rates, prompt-token savings, reranker timings and pool usage (admin only)."""
+    return {
+        "embedding_cache": await asyncio.to_thread(qdrant_service.embedding_cache.stats),
+        "answer_cache": rag_service.answer_cache.stats(),
+        "content_cache": content_cache.stats(),
+        "prompt_context": rag_service.context_stats.stats(),
+        "conversations": rag_service.conversations.stats(),
+        "history_writer": history_writer.stats(),
+        "database_pool": pool_stats(),
+        "profile_cache": profile_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "reranker": rag_service.reranker.stats() if rag_service.reranker else None,
+        "singleflight": rag_service.inflight.stats(),
+        "upstream": {"chat": chat_upstream.stats(), "embedding": embedding_upstream.stats()}
     }
 
 
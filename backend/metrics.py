@@ -0,0 +1,255 @@
+"""
+Minimal Prometheus-style metrics for the API.
+
+Counters, gauges and histograms keep their samples in memory and are
+rendered in the Prometheus text format at /metrics. Values that other
+services already count (cache hits, pool usage) are read at scrape time
+through callbacks instead of being counted twice. Everything is a no-op
+when settings.metrics_enabled is off.
+"""
+
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+TRACE_HEADER = "x-trace-id"
+
+# Trace id of the request being handled
+trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+    
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+    
+    def inc(self, amount: float = 1, **labels):
+        if not settings.metrics_enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+    
+    def inc(self, amount: float = 1, **labels):
+        if not settings.metrics_enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+    
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+        # key -> [bucket counts..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+    
+    def observe(self, value: float, **labels):
+        if not settings.metrics_enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, series in self._series.items():
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class _Callback(_Metric):
+    """Metric whose samples are read from a function at scrape time."""
+    
+    def __init__(self, name: str, help: str, kind: str, labelnames: Tuple[str, ...], read: Callable[[], Dict]):
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.read = read
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.read().items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Registry:
+    """All metrics served at /metrics."""
+    
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+    
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+    
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+    
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+    
+    def callback(self, name: str, help: str, kind: str, labelnames: Tuple[str, ...], read: Callable[[], Dict]):
+        """Register samples read at scrape time: read() returns {label values tuple: value}."""
+        self._add(_Callback(name, help, kind, labelnames, read))
+    
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_seconds", "Time spent in each stage of the RAG pipeline.", ("stage",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by OpenAI usage, by operation and kind.", ("operation", "kind")
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "Requests currently being handled."
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "Request duration until the response body is complete.", ("method", "path", "status")
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as one RAG pipeline stage."""
+    if not settings.metrics_enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def record_usage(operation: str, usage):
+    """Count prompt and completion tokens from an OpenAI response's usage field."""
+    if usage is None or not settings.metrics_enabled:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens, operation=operation, kind="prompt")
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, operation=operation, kind="completion")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request and tracking in-flight requests.
+    
+    The response carries an X-Trace-Id header: the caller's, if it sent
+    one, otherwise a new id. Streaming responses are timed until their
+    last chunk is sent.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        incoming = dict(scope["headers"]).get(TRACE_HEADER.encode("latin-1"))
+        request_trace_id = incoming.decode("latin-1")[:128] if incoming else uuid.uuid4().hex
+        token = trace_id.set(request_trace_id)
+        status = 500
+        
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (TRACE_HEADER.encode("latin-1"), request_trace_id.encode("latin-1"))
+                ]
+            await send(message)
+        
+        if not settings.metrics_enabled:
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                trace_id.reset(token)
+            return
+        
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            # Label by route template, not raw path, to bound the number of series
+            route_path = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_IN_FLIGHT.dec()
+            HTTP_SECONDS.observe(
+                time.perf_counter() - started, method=scope["method"], path=route_path, status=status
+            )
+            trace_id.reset(token)
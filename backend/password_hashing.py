@@ -0,0 +1,73 @@
+"""
+bcrypt hashing off the event loop.
+
+bcrypt costs hundreds of milliseconds of CPU per call; run inline, a burst
+of logins stalls every other request. Calls run on a small dedicated
+thread pool (bcrypt releases the GIL) and are rejected outright once too
+many are waiting, so a burst sheds load instead of queueing for minutes.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+import bcrypt
+
+from config import settings
+
+
+class HashingPoolBusy(Exception):
+    """Raised when too many password hashes are already queued."""
+
+
+class PasswordHasher:
+    """Bounded thread pool for bcrypt hash and verify calls."""
+    
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.rounds = rounds
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+    
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HashingPoolBusy()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+    
+    def _hash(self, password: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    
+    @staticmethod
+    def _verify(password: str, hashed: str) -> bool:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    
+    async def hash(self, password: str) -> str:
+        """Hash a password with the configured cost factor."""
+        return await self._run(self._hash, password)
+    
+    async def verify(self, password: str, hashed: str) -> bool:
+        """Verify a password against its hash (any cost factor)."""
+        return await self._run(self._verify, password, hashed)
+    
+    def stats(self) -> Dict:
+        return {
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.bcrypt_workers,
+    max_pending=settings.bcrypt_max_pending,
+    rounds=settings.bcrypt_rounds
+)
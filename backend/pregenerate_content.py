@@ -0,0 +1,86 @@
+"""
+Batch job that pre-generates personalized and Urdu variants of every page.
+
+For each markdown page in docs/ it fills the content_variants cache for all
+nine (software, hardware) experience tiers plus the Urdu translation, so
+the first click on "Personalize" or "Urdu" is served from the database.
+Variants are keyed by the hash of the page's markdown body (frontmatter
+removed), so they are hit when the site posts that text. Variants already
+generated from the current source are skipped; when a page has been
+edited, the new version is generated and the old version's variants are
+deleted.
+"""
+
+import argparse
+import asyncio
+from itertools import product
+from pathlib import Path
+
+from content_cache import content_cache, page_key, ANY_TIER
+from database import SessionLocal, init_db
+from document_loader import FRONTMATTER_RE, discover_files
+from rag_service import rag_service, profile_tier
+
+EXPERIENCE_LEVELS = ["beginner", "intermediate", "advanced"]
+
+
+async def pregenerate_page(page_path: str, content: str, semaphore: asyncio.Semaphore) -> int:
+    """Generate every missing variant of one page and drop stale ones. Returns the number generated."""
+    jobs = [
+        (
+            profile_tier({"software_experience": sw_exp, "hardware_experience": hw_exp}),
+            "en",
+            lambda profile={"software_experience": sw_exp, "hardware_experience": hw_exp}:
+                rag_service.personalize_content(content, profile)
+        )
+        for sw_exp, hw_exp in product(EXPERIENCE_LEVELS, repeat=2)
+    ]
+    jobs.append((ANY_TIER, "ur", lambda: rag_service.translate_to_urdu(content)))
+    
+    async def run(tier, language, generate) -> int:
+        async with semaphore:
+            async with SessionLocal() as db:
+                if await content_cache.get(db, content, tier, language) is not None:
+                    return 0
+                await db.rollback()
+                variant = await generate()
+                await content_cache.put(db, content, tier, language, variant, page_path)
+                print(f"Generated {page_path} [{tier}, {language}]")
+                return 1
+    
+    generated = sum(await asyncio.gather(*(run(*job) for job in jobs)))
+    async with SessionLocal() as db:
+        stale = await content_cache.prune_page(db, page_path, content)
+    if stale:
+        print(f"Deleted {stale} stale variants of {page_path}")
+    return generated
+
+
+async def pregenerate(docs_dir: str = '../docs', concurrency: int = 4):
+    """Pre-generate variants for every page under docs_dir."""
+    docs_path = Path(docs_dir)
+    if not docs_path.exists():
+        print(f"Error: {docs_dir} does not exist")
+        return
+    
+    await init_db()
+    semaphore = asyncio.Semaphore(concurrency)
+    pages = list(discover_files(docs_path))
+    print(f"Found {len(pages)} pages")
+    
+    generated = 0
+    for page in pages:
+        with open(page, 'r', encoding='utf-8') as f:
+            content = f.read()
+        content = FRONTMATTER_RE.sub('', content, count=1)
+        generated += await pregenerate_page(page_key(page.relative_to(docs_path).as_posix()), content, semaphore)
+    
+    print(f"✅ Generated {generated} variants")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pre-generate personalized and translated page variants")
+    parser.add_argument('--docs-dir', default='../docs')
+    parser.add_argument('--concurrency', type=int, default=4, help="LLM calls in flight")
+    args = parser.parse_args()
+    asyncio.run(pregenerate(args.docs_dir, args.concurrency))
@@ -0,0 +1,88 @@
+"""
+TTL cache of user profiles.
+
+Every authenticated request is served the stored profile from here, so a
+profile update applies to all of the user's tokens. Tokens carry the
+profile_version they were issued with: a cached copy older than the token
+(updated through another process) is reloaded, and an old token after an
+update still gets the new profile. A database query is only needed once
+per user per ttl_seconds.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import User
+
+
+def user_profile(user: User) -> Dict:
+    """Public profile fields of a user, as returned by the auth endpoints."""
+    return {
+        "id": user.id,
+        "email": user.email,
+        "name": user.name,
+        "software_experience": user.software_experience,
+        "hardware_experience": user.hardware_experience
+    }
+
+
+class ProfileCache:
+    """LRU of user profiles that expire after ttl_seconds."""
+    
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # user id -> (expiry, profile_version, profile)
+        self._entries: "OrderedDict[int, Tuple[float, int, Dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, user_id: int, min_version: int = 0) -> Optional[Dict]:
+        """Return a cached profile at least min_version new, or None without touching the database."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires, version, profile = entry
+        if expires < time.monotonic() or version < min_version:
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return profile
+    
+    def put(self, user: User):
+        self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user.profile_version, user_profile(user))
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    async def load(self, db: AsyncSession, user_id: int, min_version: int = 0) -> Optional[Dict]:
+        """Return the stored profile, from the cache or the database."""
+        profile = self.get(user_id, min_version)
+        if profile is not None:
+            self.hits += 1
+            return profile
+        self.misses += 1
+        user = await db.get(User, user_id, populate_existing=True)
+        if user is None:
+            return None
+        self.put(user)
+        return user_profile(user)
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+profile_cache = ProfileCache(
+    ttl_seconds=settings.profile_cache_ttl_seconds,
+    max_entries=settings.profile_cache_max_entries
+)
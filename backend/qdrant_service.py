@@ -1,114 +1,494 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from openai import OpenAI
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, PointIdsList, QueryRequest,
+    Prefetch, Filter, FieldCondition, MatchText, FusionQuery, Fusion,
+    TextIndexParams, TextIndexType, TokenizerType,
+    SparseVector, SparseVectorParams, Modifier
+)
 from config import settings
-from typing import List, Dict
+from metrics import stage
+from embedding_cache import create_embedding_cache, make_key
+from embeddings import create_embedding_backend
+from local_index import LocalVectorIndex, write_index
+from sparse_encoder import BM25SparseEncoder
+from tokens import count_tokens
+from upstream import BULK, call_priority
+from typing import List, Dict, AsyncIterable, AsyncIterator, Iterable, Optional, Set, Tuple, Union
+import asyncio
+import time
 import uuid
 
+# Namespace for deterministic chunk point ids
+POINT_ID_NAMESPACE = uuid.UUID("3f6d2a52-8c4e-4a57-9a0e-6c1f5b7d9e21")
+
+# The one point of a collection's "__meta" collection, whose payload holds its current version
+VERSION_POINT_ID = str(uuid.uuid5(POINT_ID_NAMESPACE, "collection-version"))
+
+# Words of a highlighted passage used for the full-text filter
+SELECTED_TEXT_MATCH_WORDS = 24
+
+# Named vectors of hybrid collections
+DENSE_VECTOR = "dense"
+SPARSE_VECTOR = "sparse"
+
+
+async def _iterate_async(items: Iterable) -> AsyncIterator:
+    for item in items:
+        yield item
+
 
 class QdrantService:
     """Service for managing Qdrant vector database operations."""
     
     def __init__(self):
-        self.client = QdrantClient(
-            url=settings.qdrant_url,
-            api_key=settings.qdrant_api_key
-        )
-        self.openai_client = OpenAI(api_key=settings.openai_api_key)
+        if settings.qdrant_url == ":memory:":
+            self.client = AsyncQdrantClient(location=":memory:")
+        else:
+            self.client = AsyncQdrantClient(
+                url=settings.qdrant_url,
+                api_key=settings.qdrant_api_key
+            )
+        self.embedding_backend = create_embedding_backend()
+        # Each backend's vectors have their own dimension, so each gets its own collection
         self.collection_name = settings.qdrant_collection_name
-        
-    def create_collection(self):
-        """Create Qdrant collection if it doesn't exist."""
+        if self.embedding_backend.name != "openai":
+            self.collection_name += f"__{self.embedding_backend.slug}"
+        self.embedding_cache = create_embedding_cache()
+        # Bumped on every write so caches derived from search results can invalidate
+        self._write_version = 0
+        # Writes by other processes (ingest_content.py) are seen through a version stored in Qdrant
+        self.meta_collection_name = f"{self.collection_name}__meta"
+        self._shared_version: Optional[str] = None
+        self._shared_version_checked = float("-inf")
+        self.hybrid = settings.retrieval_mode == "hybrid"
+        # Dense vectors are named only in hybrid collections
+        self.dense_vector = DENSE_VECTOR if self.hybrid else None
+        self.sparse_encoder = BM25SparseEncoder(avg_doc_tokens=settings.bm25_avg_doc_tokens)
+        self.local_index = None
+        if settings.local_index_enabled and self.hybrid:
+            # The local index holds dense vectors only; serving from it would silently drop BM25 and RRF
+            print("local_index_enabled is ignored with retrieval_mode=hybrid; searching Qdrant instead")
+        elif settings.local_index_enabled:
+            self.local_index = LocalVectorIndex(settings.local_index_path)
+    
+    async def collection_version(self):
+        """
+        Changes whenever search results may have changed: a write by this or
+        any other process, or a local index reload. Other processes' writes
+        are noticed within answer_cache_version_check_seconds.
+        """
+        now = time.monotonic()
+        if now - self._shared_version_checked >= settings.answer_cache_version_check_seconds:
+            self._shared_version_checked = now
+            try:
+                points = await self.client.retrieve(self.meta_collection_name, ids=[VERSION_POINT_ID])
+                self._shared_version = points[0].payload["version"] if points else None
+            except Exception:
+                # Nothing has been written since versions were introduced
+                self._shared_version = None
+        local_version = self.local_index.meta["version"] if self.local_index and self.local_index.meta else None
+        return self._write_version, self._shared_version, local_version
+    
+    async def _publish_version(self):
+        """Record a new collection version where every process using the collection can see it."""
+        self._write_version += 1
         try:
-            self.client.get_collection(self.collection_name)
+            if not await self.client.collection_exists(self.meta_collection_name):
+                await self.client.create_collection(
+                    collection_name=self.meta_collection_name,
+                    vectors_config=VectorParams(size=1, distance=Distance.DOT)
+                )
+            await self.client.upsert(
+                collection_name=self.meta_collection_name,
+                points=[PointStruct(id=VERSION_POINT_ID, vector=[0.0], payload={"version": uuid.uuid4().hex})]
+            )
+        except Exception as e:
+            # Other processes keep serving cached answers until their TTL runs out
+            print(f"Failed to publish collection version: {e}")
+    
+    async def create_collection(self) -> bool:
+        """Create Qdrant collection if it doesn't exist. Returns True if created."""
+        dense_params = VectorParams(
+            size=self.embedding_backend.dimension,
+            distance=Distance.COSINE
+        )
+        if await self.client.collection_exists(self.collection_name):
             print(f"Collection '{self.collection_name}' already exists")
-        except:
-            self.client.create_collection(
+            created = False
+            info = await self.client.get_collection(self.collection_name)
+            vectors = info.config.params.vectors
+            dimension = vectors[DENSE_VECTOR].size if isinstance(vectors, dict) else vectors.size
+            if bool(info.config.params.sparse_vectors) != self.hybrid or dimension != dense_params.size:
+                print(f"Warning: collection '{self.collection_name}' was not created for "
+                      f"retrieval_mode={settings.retrieval_mode} with {dense_params.size}-d embeddings; "
+                      f"re-run ingest_content.py --rebuild")
+        else:
+            await self.client.create_collection(
                 collection_name=self.collection_name,
-                vectors_config=VectorParams(
-                    size=settings.embedding_dimension,
-                    distance=Distance.COSINE
-                )
+                vectors_config={DENSE_VECTOR: dense_params} if self.hybrid else dense_params,
+                sparse_vectors_config={
+                    SPARSE_VECTOR: SparseVectorParams(modifier=Modifier.IDF)
+                } if self.hybrid else None
             )
             print(f"Created collection '{self.collection_name}'")
-    
-    def get_embedding(self, text: str) -> List[float]:
-        """Generate embedding using OpenAI."""
-        response = self.openai_client.embeddings.create(
-            model=settings.embedding_model,
-            input=text
+            created = True
+        
+        # Full-text index used by selected-text search; creating it again is a no-op
+        await self.client.create_payload_index(
+            collection_name=self.collection_name,
+            field_name="text",
+            field_schema=TextIndexParams(
+                type=TextIndexType.TEXT,
+                tokenizer=TokenizerType.WORD,
+                lowercase=True,
+                min_token_len=2,
+                max_token_len=30
+            )
         )
-        return response.data[0].embedding
+        return created
+    
+    async def delete_collection(self):
+        """Drop the collection and every point in it."""
+        await self.client.delete_collection(self.collection_name)
+        await self._publish_version()
+        print(f"Deleted collection '{self.collection_name}'")
+    
+    async def close(self):
+        """Close the Qdrant client's connections."""
+        await self.client.close()
     
-    def add_documents(self, documents: List[Dict[str, str]]):
+    @staticmethod
+    def point_id(source: str, chunk_index: int, content_hash: str) -> str:
+        """Deterministic point id for a chunk, so re-ingesting it overwrites in place."""
+        return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source}:{chunk_index}:{content_hash}"))
+    
+    async def get_embedding(self, text: str) -> List[float]:
+        """Generate embedding for one text."""
+        return (await self.get_embeddings([text]))[0]
+    
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
-        Add documents to Qdrant.
-        documents: [{"text": "...", "metadata": {...}}, ...]
+        Generate embeddings for many texts, going through the embedding cache.
+        Only texts missing from the cache are sent to the embedding backend, in one batch.
         """
-        points = []
-        for doc in documents:
-            embedding = self.get_embedding(doc["text"])
-            point = PointStruct(
-                id=str(uuid.uuid4()),
-                vector=embedding,
+        keys = [make_key(self.embedding_backend.model, text) for text in texts]
+        embeddings = await asyncio.to_thread(self.embedding_cache.get_many, keys)
+        
+        missing = {key: text for key, text, embedding in zip(keys, texts, embeddings) if embedding is None}
+        if missing:
+            with stage("embed"):
+                vectors = await self.embedding_backend.embed(list(missing.values()))
+            fresh = dict(zip(missing, vectors))
+            # Ingested chunks go to disk only, so they don't push query embeddings out of memory
+            await asyncio.to_thread(self.embedding_cache.put_many, fresh, call_priority.get() != BULK)
+            embeddings = [fresh[key] if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
+        
+        return embeddings
+    
+    async def _batch_documents(
+        self,
+        documents: Union[Iterable[Dict], AsyncIterable[Dict]],
+        batch_size: int,
+        max_tokens: int
+    ) -> AsyncIterator[List[Dict]]:
+        """Group documents into embedding batches bounded by count and tokens."""
+        if not hasattr(documents, "__aiter__"):
+            documents = _iterate_async(documents)
+        batch: List[Dict] = []
+        batch_tokens = 0
+        async for doc in documents:
+            doc_tokens = count_tokens(doc["text"], settings.embedding_model)
+            if batch and (len(batch) >= batch_size or batch_tokens + doc_tokens > max_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(doc)
+            batch_tokens += doc_tokens
+        if batch:
+            yield batch
+    
+    def _point_vector(self, text: str, embedding: List[float]):
+        """Vector(s) stored for a point: dense only, or named dense + sparse."""
+        if not self.hybrid:
+            return embedding
+        indices, values = self.sparse_encoder.encode_document(text)
+        return {
+            DENSE_VECTOR: embedding,
+            SPARSE_VECTOR: SparseVector(indices=indices, values=values)
+        }
+    
+    async def _embed_batch(self, batch: List[Dict]) -> List[PointStruct]:
+        """Embed one batch of documents and turn it into Qdrant points."""
+        embeddings = await self.get_embeddings([doc["text"] for doc in batch])
+        return [
+            PointStruct(
+                id=doc.get("id") or str(uuid.uuid4()),
+                vector=self._point_vector(doc["text"], embedding),
                 payload={
                     "text": doc["text"],
                     **doc.get("metadata", {})
                 }
             )
-            points.append(point)
-        
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=points
-        )
-        print(f"Added {len(points)} documents to Qdrant")
+            for doc, embedding in zip(batch, embeddings)
+        ]
     
-    def search(self, query: str, limit: int = 5) -> List[Dict]:
-        """Search for similar documents."""
-        query_embedding = self.get_embedding(query)
+    async def add_documents(
+        self,
+        documents: Union[Iterable[Dict], AsyncIterable[Dict]],
+        batch_size: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ) -> Dict:
+        """
+        Add documents to Qdrant.
+        documents: [{"text": "...", "metadata": {...}, "id": optional point id}, ...]
+        (any iterable or async iterable; it is consumed lazily)
         
-        results = self.client.query_points(
+        Texts are embedded in batches (bounded by batch_size and max_tokens),
+        with at most `concurrency` embeddings requests in flight. Points are
+        upserted in pages of `qdrant_upsert_batch_size` as soon as they are
+        ready, so only a few pages of vectors are held in memory at once.
+        """
+        batch_size = batch_size or settings.embedding_batch_size
+        max_tokens = max_tokens or settings.embedding_batch_max_tokens
+        concurrency = concurrency or settings.embedding_max_concurrency
+        page_size = settings.qdrant_upsert_batch_size
+        
+        started = time.perf_counter()
+        # Ingestion embeddings queue behind the ones chat is waiting for
+        priority_token = call_priority.set(BULK)
+        in_flight: Set[asyncio.Task] = set()
+        buffer: List[PointStruct] = []
+        embedded = 0
+        upserted = 0
+        batches = 0
+        
+        async def flush(force: bool = False):
+            nonlocal buffer, upserted
+            while buffer and (force or len(buffer) >= page_size):
+                page, buffer = buffer[:page_size], buffer[page_size:]
+                await self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=page
+                )
+                upserted += len(page)
+                self._write_version += 1
+        
+        async def collect(return_when: str):
+            nonlocal in_flight, embedded, batches
+            done, in_flight = await asyncio.wait(in_flight, return_when=return_when)
+            for task in done:
+                points = task.result()
+                buffer.extend(points)
+                embedded += len(points)
+                batches += 1
+            elapsed = time.perf_counter() - started
+            print(f"Embedded {embedded} documents in {batches} batches ({embedded / elapsed:.1f} docs/s)")
+            await flush()
+        
+        try:
+            async for batch in self._batch_documents(documents, batch_size, max_tokens):
+                if len(in_flight) >= concurrency:
+                    await collect(asyncio.FIRST_COMPLETED)
+                in_flight.add(asyncio.create_task(self._embed_batch(batch)))
+            if in_flight:
+                await collect(asyncio.ALL_COMPLETED)
+            await flush(force=True)
+        finally:
+            for task in in_flight:
+                task.cancel()
+            call_priority.reset(priority_token)
+        if upserted:
+            await self._publish_version()
+        
+        elapsed = time.perf_counter() - started
+        stats = {
+            "documents": upserted,
+            "batches": batches,
+            "seconds": round(elapsed, 3),
+            "docs_per_second": round(upserted / elapsed, 1) if elapsed else 0.0
+        }
+        print(f"Added {upserted} documents to Qdrant in {elapsed:.1f}s ({stats['docs_per_second']} docs/s)")
+        return stats
+    
+    async def export_points(self) -> List[Tuple[List[float], Dict]]:
+        """Read every (dense vector, payload) pair in the collection."""
+        points = []
+        offset = None
+        while True:
+            batch, offset = await self.client.scroll(
+                collection_name=self.collection_name,
+                limit=1024,
+                offset=offset,
+                with_payload=True,
+                with_vectors=[DENSE_VECTOR] if self.hybrid else True
+            )
+            for point in batch:
+                vector = point.vector[DENSE_VECTOR] if isinstance(point.vector, dict) else point.vector
+                points.append((vector, point.payload))
+            if offset is None:
+                return points
+    
+    async def build_local_index(self) -> Dict:
+        """Snapshot the collection into the in-process index files."""
+        points = await self.export_points()
+        meta = await asyncio.to_thread(write_index, settings.local_index_path, points, settings.local_index_dtype)
+        print(f"Built local index {meta['version']} with {meta['count']} vectors at {settings.local_index_path}")
+        return meta
+    
+    async def delete_points(self, ids: List[str]):
+        """Delete points by id."""
+        for offset in range(0, len(ids), settings.qdrant_upsert_batch_size):
+            await self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=ids[offset:offset + settings.qdrant_upsert_batch_size])
+            )
+        await self._publish_version()
+    
+    async def set_payload(self, ids: List[str], payload: Dict):
+        """Overwrite payload keys on existing points without re-embedding them."""
+        await self.client.set_payload(
             collection_name=self.collection_name,
-            query=query_embedding,
-            limit=limit
+            payload=payload,
+            points=ids
         )
-        
+        await self._publish_version()
+    
+    @staticmethod
+    def _format_hits(points) -> List[Dict]:
         return [
             {
                 "text": hit.payload["text"],
                 "score": hit.score,
                 "metadata": {k: v for k, v in hit.payload.items() if k != "text"}
             }
-            for hit in results.points
+            for hit in points
         ]
     
-    def search_selected_text(self, selected_text: str, query: str, limit: int = 3) -> List[Dict]:
-        """Search within selected text context."""
-        # First, find chunks related to the selected text
-        selected_embedding = self.get_embedding(selected_text)
-        
-        # Get chunks similar to selected text
-        context_results = self.client.search(
-            collection_name=self.collection_name,
-            query_vector=selected_embedding,
-            limit=10
-        )
-        
-        # Filter and re-rank based on the actual query
-        query_embedding = self.get_embedding(query)
-        filtered_results = []
+    def _query_args(
+        self,
+        query: Optional[str],
+        query_embedding: List[float],
+        limit: int,
+        query_filter: Optional[Filter] = None
+    ) -> Dict:
+        """
+        Query arguments for one search: a plain dense query, or in hybrid mode
+        dense and BM25 prefetches fused with reciprocal rank fusion.
+        """
+        if not self.hybrid or not query:
+            return {"query": query_embedding, "using": self.dense_vector, "filter": query_filter}
+        indices, values = self.sparse_encoder.encode_query(query)
+        candidates = limit * 4
+        return {
+            "prefetch": [
+                Prefetch(query=query_embedding, using=DENSE_VECTOR, filter=query_filter, limit=candidates),
+                Prefetch(
+                    query=SparseVector(indices=indices, values=values),
+                    using=SPARSE_VECTOR,
+                    filter=query_filter,
+                    limit=candidates
+                )
+            ],
+            "query": FusionQuery(fusion=Fusion.RRF)
+        }
+    
+    async def _use_local_index(self) -> bool:
+        """Whether to serve dense search in-process, picking up a rebuilt index first."""
+        if self.local_index is None:
+            return False
+        if self.local_index.reload_due():
+            # File reads and np.load stay off the event loop
+            await asyncio.to_thread(self.local_index.maybe_reload)
+        return self.local_index.ready
+    
+    async def search(self, query: str, limit: int = 5) -> List[Dict]:
+        """Search for similar documents."""
+        query_embedding = await self.get_embedding(query)
+        return await self.search_by_vector(query_embedding, limit, query=query)
+    
+    async def search_by_vector(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        query: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Search with an already computed embedding (plus the query text in hybrid mode).
+        Served in-process from the local index when it is enabled and built; that
+        path is dense-only.
+        """
+        with stage("search"):
+            if await self._use_local_index():
+                return await asyncio.to_thread(self.local_index.search, query_embedding, limit)
+            args = self._query_args(query, query_embedding, limit)
+            results = await self.client.query_points(
+                collection_name=self.collection_name,
+                query=args["query"],
+                using=args.get("using"),
+                prefetch=args.get("prefetch"),
+                query_filter=args.get("filter"),
+                limit=limit
+            )
+        return self._format_hits(results.points)
+    
+    async def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        limit: int = 5,
+        queries: Optional[List[str]] = None
+    ) -> List[List[Dict]]:
+        """Run many searches in a single Qdrant request."""
+        if not query_embeddings:
+            return []
+        with stage("search_batch"):
+            if await self._use_local_index():
+                return await asyncio.to_thread(self.local_index.search_many, query_embeddings, limit)
+            queries = queries or [None] * len(query_embeddings)
+            responses = await self.client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=[
+                    # Explicit offset: local-mode Qdrant does not default it for prefetch queries
+                    QueryRequest(**self._query_args(query, embedding, limit), limit=limit, offset=0, with_payload=True)
+                    for query, embedding in zip(queries, query_embeddings)
+                ]
+            )
+        return [self._format_hits(response.points) for response in responses]
+    
+    async def search_selected_text(self, selected_text: str, query: str, limit: int = 3) -> List[Dict]:
+        """
+        Search within selected text context, in one Qdrant request.
         
-        for hit in context_results:
-            # Simple relevance check: if selected text is in the chunk
-            if selected_text.lower() in hit.payload["text"].lower():
-                filtered_results.append({
-                    "text": hit.payload["text"],
-                    "score": hit.score,
-                    "metadata": {k: v for k, v in hit.payload.items() if k != "text"}
-                })
+        Prefetches ranked by the question, one restricted by the full-text
+        index to chunks containing the selected words, are fused with
+        reciprocal rank fusion. Chunks that contain the selection and match
+        the question rank first, and the unfiltered branch keeps results
+        coming when the selection spans a chunk boundary.
+        """
+        query_embedding = await self.get_embedding(query)
         
-        return filtered_results[:limit]
+        # Long highlights rarely fit inside one chunk; match on their opening words
+        match_words = " ".join(selected_text.split()[:SELECTED_TEXT_MATCH_WORDS])
+        candidates = limit * 4
+        selection_filter = Filter(must=[FieldCondition(key="text", match=MatchText(text=match_words))])
+        unfiltered = self._query_args(query, query_embedding, candidates)
+        with stage("search"):
+            results = await self.client.query_points(
+                collection_name=self.collection_name,
+                prefetch=[
+                    Prefetch(
+                        query=query_embedding,
+                        using=self.dense_vector,
+                        filter=selection_filter,
+                        limit=candidates
+                    ),
+                    *unfiltered.get("prefetch", [
+                        Prefetch(query=query_embedding, using=self.dense_vector, limit=candidates)
+                    ])
+                ],
+                query=FusionQuery(fusion=Fusion.RRF),
+                limit=limit
+            )
+        return self._format_hits(results.points)
 
 
 # Global instance
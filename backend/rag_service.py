@@ -1,28 +1,89 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
 from qdrant_service import qdrant_service
+from answer_cache import SemanticAnswerCache
+from reranker import CrossEncoderReranker
+from context_builder import ContextStats, build_context
+from conversation import ConversationMemory, Turn
+from tokens import truncate_tokens
+from metrics import STAGE_SECONDS, record_usage, stage
+from singleflight import SingleFlight
+from upstream import BULK, INTERACTIVE, UpstreamBusy, chat_upstream, estimate_tokens
 from config import settings
-from typing import List, Dict, Optional
+from contextlib import aclosing
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import time
+
+
+def profile_tier(user_profile: Optional[Dict]) -> str:
+    """Collapse a user profile into the experience tier that shapes answers."""
+    if not user_profile:
+        return "anonymous"
+    sw_exp = user_profile.get('software_experience', 'intermediate')
+    hw_exp = user_profile.get('hardware_experience', 'intermediate')
+    return f"{sw_exp}:{hw_exp}"
+
+
+def _failed_answer(error: BaseException) -> Dict:
+    """Batch result for a question that could not be answered; the others still are."""
+    if isinstance(error, UpstreamBusy):
+        detail = str(error)
+    else:
+        print(f"Batch question failed: {error!r}")
+        detail = "Failed to answer this question"
+    return {"answer": None, "sources": [], "error": detail}
+
+
+def _digest(text: Optional[str]) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def _normalize_content(content: str) -> str:
+    """Content as coalescing sees it: line endings and surrounding whitespace don't matter."""
+    return content.replace("\r\n", "\n").strip()
 
 
 class RAGService:
     """Service for Retrieval-Augmented Generation."""
     
     def __init__(self):
-        self.client = OpenAI(api_key=settings.openai_api_key)
+        # Retries happen in the upstream scheduler, which also sees the 429s
+        self.client = AsyncOpenAI(
+            api_key=settings.openai_api_key, base_url=settings.openai_base_url, max_retries=0
+        )
+        self.answer_cache = SemanticAnswerCache(
+            threshold=settings.answer_cache_threshold,
+            ttl_seconds=settings.answer_cache_ttl_seconds,
+            max_entries=settings.answer_cache_max_entries
+        )
+        self.context_stats = ContextStats()
+        self.conversations = ConversationMemory(
+            summarize=self.summarize_conversation,
+            max_sessions=settings.conversation_cache_sessions
+        )
+        self.reranker = CrossEncoderReranker() if settings.rerank_enabled else None
+        # Over-fetch when a reranker will narrow the candidates down again
+        self.search_limit = settings.rerank_candidates if self.reranker else 5
+        self.selected_text_limit = settings.rerank_candidates if self.reranker else 3
+        # Identical requests in flight at the same time share one completion
+        self.inflight = SingleFlight()
     
-    def generate_answer(
+    def build_messages(
         self,
         question: str,
         context_chunks: List[Dict],
-        user_profile: Optional[Dict] = None
-    ) -> str:
-        """Generate answer using RAG."""
+        user_profile: Optional[Dict] = None,
+        selected_text: Optional[str] = None,
+        history: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Build the chat messages for a RAG answer, after any earlier turns of the conversation."""
         
-        # Build context from retrieved chunks
-        context = "\n\n".join([
-            f"[Source: {chunk['metadata'].get('source', 'Unknown')}]\n{chunk['text']}"
-            for chunk in context_chunks
-        ])
+        # Build context from the selection and retrieved chunks, within the model's budget
+        with stage("context"):
+            context, context_stats = build_context(context_chunks, selected_text, settings.openai_model)
+        self.context_stats.record(context_stats)
         
         # Build system prompt with user profile
         system_prompt = "You are an expert AI assistant for a Physical AI & Humanoid Robotics textbook."
@@ -32,6 +93,11 @@ class RAGService:
             hw_exp = user_profile.get('hardware_experience', 'intermediate')
             system_prompt += f"\n\nThe user has {sw_exp} software experience and {hw_exp} hardware experience. Tailor your explanations accordingly."
         
+        if history and history["summary"]:
+            system_prompt += f"\n\nSummary of the earlier conversation:\n{history['summary']}"
+        
+        question = truncate_tokens(question, settings.question_max_tokens)
+        
         # Build user prompt
         user_prompt = f"""Based on the following context from the textbook, answer the question.
 
@@ -42,55 +108,387 @@ Question: {question}
 
 Provide a clear, comprehensive answer based on the context. If the context doesn't contain enough information, say so."""
         
-        # Generate response
-        response = self.client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+        messages = [{"role": "system", "content": system_prompt}]
+        for previous_question, previous_answer in (history["turns"] if history else []):
+            messages.append({"role": "user", "content": previous_question})
+            messages.append({"role": "assistant", "content": previous_answer})
+        messages.append({"role": "user", "content": user_prompt})
+        return messages
+    
+    async def complete(self, operation: str, messages: List[Dict], priority: int, **params) -> str:
+        """One chat completion, scheduled with the given priority; returns its text."""
+        with stage(operation):
+            response = await chat_upstream.call(
+                operation,
+                lambda: self.client.chat.completions.create(
+                    model=settings.openai_model,
+                    messages=messages,
+                    **params
+                ),
+                tokens=estimate_tokens(messages, params.get("max_tokens")),
+                priority=priority
+            )
+        record_usage(operation, response.usage)
+        return response.choices[0].message.content
+    
+    async def generate_answer(
+        self,
+        question: str,
+        context_chunks: List[Dict],
+        user_profile: Optional[Dict] = None,
+        selected_text: Optional[str] = None,
+        history: Optional[Dict] = None,
+        priority: int = INTERACTIVE
+    ) -> str:
+        """Generate answer using RAG."""
+        
+        return await self.complete(
+            "answer",
+            self.build_messages(question, context_chunks, user_profile, selected_text, history),
+            priority,
             temperature=0.7,
             max_tokens=1000
         )
+    
+    async def stream_generate_answer(
+        self,
+        question: str,
+        context_chunks: List[Dict],
+        user_profile: Optional[Dict] = None,
+        selected_text: Optional[str] = None,
+        history: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """Generate answer using RAG, yielding tokens as they arrive."""
         
-        return response.choices[0].message.content
+        started = time.perf_counter()
+        first_token = True
+        messages = self.build_messages(question, context_chunks, user_profile, selected_text, history)
+        tokens = estimate_tokens(messages, 1000)
+        async with chat_upstream.stream(
+            "answer_stream",
+            lambda: self.client.chat.completions.create(
+                model=settings.openai_model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000,
+                stream=True,
+                stream_options={"include_usage": True}
+            ),
+            tokens=tokens,
+            priority=INTERACTIVE
+        ) as stream:
+            try:
+                async for chunk in stream:
+                    # The last chunk carries usage and no choices
+                    usage = getattr(chunk, "usage", None)
+                    record_usage("answer_stream", usage)
+                    chat_upstream.reconcile(tokens, usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token:
+                            STAGE_SECONDS.observe(time.perf_counter() - started, stage="first_token")
+                            first_token = False
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Stop paying for tokens nobody will read
+                await stream.close()
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage="answer_stream")
     
-    def answer_question(
+    async def retrieve_context(
+        self,
+        question: str,
+        selected_text: Optional[str] = None
+    ) -> List[Dict]:
+        """Retrieve context chunks for a question."""
+        if selected_text:
+            context_chunks = await qdrant_service.search_selected_text(
+                selected_text, question, limit=self.selected_text_limit
+            )
+        else:
+            context_chunks = await qdrant_service.search(question, limit=self.search_limit)
+        return await self.rerank(question, context_chunks)
+    
+    async def rerank(self, question: str, context_chunks: List[Dict]) -> List[Dict]:
+        """Narrow over-fetched candidates down to the chunks worth prompting with."""
+        if self.reranker is None:
+            return context_chunks
+        with stage("rerank"):
+            return await self.reranker.rerank(question, context_chunks, settings.rerank_top_k)
+    
+    @staticmethod
+    def format_sources(context_chunks: List[Dict]) -> List[Dict]:
+        """Trim retrieved chunks into the sources returned to clients."""
+        return [
+            {
+                "text": chunk["text"][:200] + "...",
+                "score": chunk["score"],
+                "metadata": chunk["metadata"]
+            }
+            for chunk in context_chunks
+        ]
+    
+    @staticmethod
+    def _answer_namespace(selected_text: Optional[str], user_profile: Optional[Dict]) -> str:
+        """Answer cache partition: answers are only shared within a tier and selection."""
+        return profile_tier(user_profile) + ":" + _digest(selected_text)
+    
+    async def _lookup_cached_answer(
+        self,
+        question: str,
+        selected_text: Optional[str],
+        user_profile: Optional[Dict]
+    ) -> Tuple[Optional[Dict], Optional[List[float]], Optional[str]]:
+        """Check the answer cache. Returns (cached result, question embedding, namespace)."""
+        if not settings.answer_cache_enabled:
+            return None, None, None
+        self.answer_cache.check_version(await qdrant_service.collection_version())
+        namespace = self._answer_namespace(selected_text, user_profile)
+        question_embedding = await qdrant_service.get_embedding(question)
+        return self.answer_cache.lookup(question_embedding, namespace), question_embedding, namespace
+    
+    async def answer_question(
         self,
         question: str,
         selected_text: Optional[str] = None,
-        user_profile: Optional[Dict] = None
+        user_profile: Optional[Dict] = None,
+        history: Optional[Dict] = None
     ) -> Dict:
-        """Answer a question using RAG."""
+        """
+        Answer a question using RAG, serving near-duplicate questions from the answer cache.
+        
+        With conversation history, retrieval and the cache use the question
+        rewritten to stand on its own. Concurrent identical questions (same
+        tier, selection and history) share one answer.
+        """
+        key = (
+            self._answer_namespace(selected_text, user_profile),
+            " ".join(question.lower().split()),
+            _digest(json.dumps(history, sort_keys=True)) if history else None
+        )
+        return await self.inflight.do(
+            "answer", key, lambda: self._answer_question(question, selected_text, user_profile, history)
+        )
+    
+    async def _answer_question(
+        self,
+        question: str,
+        selected_text: Optional[str],
+        user_profile: Optional[Dict],
+        history: Optional[Dict]
+    ) -> Dict:
+        search_question = await self.condense_question(question, history)
+        cached, question_embedding, namespace = await self._lookup_cached_answer(
+            search_question, selected_text, user_profile
+        )
+        if cached is not None:
+            return cached
         
         # Search for relevant context
-        if selected_text:
-            context_chunks = qdrant_service.search_selected_text(selected_text, question)
-        else:
-            context_chunks = qdrant_service.search(question, limit=5)
+        context_chunks = await self.retrieve_context(search_question, selected_text)
         
         # Generate answer
-        answer = self.generate_answer(question, context_chunks, user_profile)
+        answer = await self.generate_answer(question, context_chunks, user_profile, selected_text, history)
         
-        return {
+        result = {
             "answer": answer,
-            "sources": [
-                {
-                    "text": chunk["text"][:200] + "...",
-                    "score": chunk["score"],
-                    "metadata": chunk["metadata"]
-                }
-                for chunk in context_chunks
-            ]
+            "sources": self.format_sources(context_chunks)
         }
+        
+        if question_embedding is not None:
+            self.answer_cache.store(question_embedding, namespace, result)
+        
+        return result
+    
+    async def stream_answer(
+        self,
+        question: str,
+        selected_text: Optional[str] = None,
+        user_profile: Optional[Dict] = None,
+        history: Optional[Dict] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Answer a question as a stream of events:
+        {"type": "sources", "sources": [...]} first, then {"type": "token", "content": "..."}.
+        """
+        
+        search_question = await self.condense_question(question, history)
+        cached, question_embedding, namespace = await self._lookup_cached_answer(
+            search_question, selected_text, user_profile
+        )
+        if cached is not None:
+            yield {"type": "sources", "sources": cached["sources"]}
+            yield {"type": "token", "content": cached["answer"]}
+            return
+        
+        context_chunks = await self.retrieve_context(search_question, selected_text)
+        sources = self.format_sources(context_chunks)
+        yield {"type": "sources", "sources": sources}
+        
+        parts = []
+        async with aclosing(self.stream_generate_answer(
+            question, context_chunks, user_profile, selected_text, history
+        )) as tokens:
+            async for token in tokens:
+                parts.append(token)
+                yield {"type": "token", "content": token}
+        
+        # Only complete answers are cached
+        if question_embedding is not None:
+            self.answer_cache.store(question_embedding, namespace, {"answer": "".join(parts), "sources": sources})
+    
+    async def condense_question(self, question: str, history: Optional[Dict]) -> str:
+        """Rewrite a follow-up question so it can be searched without the conversation."""
+        if not history or not (history["summary"] or history["turns"]):
+            return question
+        
+        conversation = ""
+        if history["summary"]:
+            conversation += f"Summary: {history['summary']}\n\n"
+        for previous_question, previous_answer in history["turns"][-2:]:
+            conversation += f"User: {previous_question}\nAssistant: {truncate_tokens(previous_answer, 200)}\n\n"
+        
+        rewritten = await self.complete(
+            "rewrite",
+            [
+                {"role": "system", "content": "Rewrite the user's follow-up question as a standalone question that can be understood without the conversation. Reply with the question only."},
+                {"role": "user", "content": f"{conversation}Follow-up question: {truncate_tokens(question, settings.question_max_tokens)}"}
+            ],
+            INTERACTIVE,
+            temperature=0,
+            max_tokens=100
+        )
+        return rewritten.strip() or question
+    
+    async def summarize_conversation(self, summary: str, turns: List[Turn]) -> str:
+        """Fold turns into the rolling summary of a conversation."""
+        transcript = "\n\n".join(
+            f"User: {question}\nAssistant: {answer}" for question, answer in turns
+        )
+        prompt = f"""Update the summary of a conversation between a student and a textbook assistant with the new turns below. Keep the topics, facts and open questions the student may refer back to.
+
+Current summary:
+{summary or "(none)"}
+
+New turns:
+{transcript}"""
+        
+        # Runs in the background, so it can wait behind interactive calls
+        return await self.complete(
+            "summarize",
+            [
+                {"role": "system", "content": "You write concise conversation summaries."},
+                {"role": "user", "content": prompt}
+            ],
+            BULK,
+            temperature=0.3,
+            max_tokens=settings.conversation_summary_max_tokens
+        )
     
-    def personalize_content(
+    async def answer_questions(
+        self,
+        questions: List[str],
+        selected_text: Optional[str] = None,
+        user_profile: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Answer many questions at once; results are returned in input order."""
+        results: List[Optional[Dict]] = [None] * len(questions)
+        async for index, result in self.stream_answer_questions(questions, selected_text, user_profile):
+            results[index] = result
+        return results
+    
+    async def stream_answer_questions(
+        self,
+        questions: List[str],
+        selected_text: Optional[str] = None,
+        user_profile: Optional[Dict] = None
+    ) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Answer many questions, yielding (index, result) as each one finishes.
+        
+        All questions are embedded in one request and searched in one Qdrant
+        batch query; completions run with at most batch_answer_concurrency
+        in flight. A question whose retrieval or completion fails gets a
+        result with answer None and an "error" message instead.
+        """
+        embeddings = await qdrant_service.get_embeddings(questions)
+        namespace = self._answer_namespace(selected_text, user_profile)
+        
+        pending = []
+        if settings.answer_cache_enabled:
+            self.answer_cache.check_version(await qdrant_service.collection_version())
+        for index, embedding in enumerate(embeddings):
+            cached = self.answer_cache.lookup(embedding, namespace) if settings.answer_cache_enabled else None
+            if cached is not None:
+                yield index, cached
+            else:
+                pending.append(index)
+        if not pending:
+            return
+        
+        semaphore = asyncio.Semaphore(settings.batch_answer_concurrency)
+        
+        async def retrieve(index: int) -> List[Dict]:
+            async with semaphore:
+                return await qdrant_service.search_selected_text(
+                    selected_text, questions[index], limit=self.selected_text_limit
+                )
+        
+        if selected_text:
+            contexts = await asyncio.gather(*(retrieve(index) for index in pending), return_exceptions=True)
+        else:
+            try:
+                contexts = await qdrant_service.search_batch(
+                    [embeddings[index] for index in pending],
+                    limit=self.search_limit,
+                    queries=[questions[index] for index in pending]
+                )
+            except Exception as e:
+                # One request for every question, so they all fail together
+                contexts = [e] * len(pending)
+        if self.reranker is not None:
+            async def rerank(index: int, context):
+                if isinstance(context, BaseException):
+                    return context
+                return await self.rerank(questions[index], context)
+            
+            contexts = await asyncio.gather(*(
+                rerank(index, context) for index, context in zip(pending, contexts)
+            ), return_exceptions=True)
+        
+        async def answer(index: int, context_chunks) -> Tuple[int, Dict]:
+            if isinstance(context_chunks, BaseException):
+                return index, _failed_answer(context_chunks)
+            try:
+                async with semaphore:
+                    answer_text = await self.generate_answer(
+                        questions[index], context_chunks, user_profile, selected_text, priority=BULK
+                    )
+            except Exception as e:
+                return index, _failed_answer(e)
+            return index, {"answer": answer_text, "sources": self.format_sources(context_chunks)}
+        
+        tasks = [asyncio.create_task(answer(index, context)) for index, context in zip(pending, contexts)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, result = await next_done
+                if settings.answer_cache_enabled and "error" not in result:
+                    self.answer_cache.store(embeddings[index], namespace, result)
+                yield index, result
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def personalize_content(
         self,
         content: str,
         user_profile: Dict
     ) -> str:
         """Personalize content based on user profile."""
-        
+        key = (profile_tier(user_profile), _digest(_normalize_content(content)))
+        return await self.inflight.do(
+            "personalize", key, lambda: self._personalize_content(content, user_profile)
+        )
+    
+    async def _personalize_content(self, content: str, user_profile: Dict) -> str:
         sw_exp = user_profile.get('software_experience', 'intermediate')
         hw_exp = user_profile.get('hardware_experience', 'intermediate')
         
@@ -103,21 +501,24 @@ Original Content:
 
 Rewrite the content to be appropriate for this experience level. Adjust technical depth, add or remove explanations, and modify examples as needed. Keep the same structure and main points."""
         
-        response = self.client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[
+        return await self.complete(
+            "personalize",
+            [
                 {"role": "system", "content": "You are an expert educational content adapter."},
                 {"role": "user", "content": prompt}
             ],
+            BULK,
             temperature=0.7,
             max_tokens=2000
         )
-        
-        return response.choices[0].message.content
     
-    def translate_to_urdu(self, content: str) -> str:
+    async def translate_to_urdu(self, content: str) -> str:
         """Translate content to Urdu."""
-        
+        return await self.inflight.do(
+            "translate", _digest(_normalize_content(content)), lambda: self._translate_to_urdu(content)
+        )
+    
+    async def _translate_to_urdu(self, content: str) -> str:
         prompt = f"""Translate the following educational content to Urdu. Maintain technical terms in English where appropriate, but provide Urdu explanations.
 
 Content:
@@ -125,17 +526,16 @@ Content:
 
 Provide a natural, educational translation in Urdu."""
         
-        response = self.client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[
+        return await self.complete(
+            "translate",
+            [
                 {"role": "system", "content": "You are an expert translator specializing in technical educational content."},
                 {"role": "user", "content": prompt}
             ],
+            BULK,
             temperature=0.5,
             max_tokens=2000
         )
-        
-        return response.choices[0].message.content
 
 
 rag_service = RAGService()
@@ -0,0 +1,93 @@
+"""
+Cross-encoder reranking of retrieved chunks under a latency budget.
+
+Retrieval over-fetches candidates; a local CPU cross-encoder scores
+(question, chunk) pairs in small batches until the per-request budget runs
+out. Scored chunks below the relevance cutoff are dropped, so the prompt
+only carries context that actually answers the question.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from config import settings
+
+
+class CrossEncoderReranker:
+    """sentence-transformers CrossEncoder kept loaded in-process."""
+    
+    def __init__(self):
+        # Optional dependency, only needed when reranking is enabled
+        from sentence_transformers import CrossEncoder
+        
+        self.model = CrossEncoder(settings.rerank_model, device="cpu", max_length=512)
+        self.batch_size = settings.rerank_batch_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.rerank_threads,
+            thread_name_prefix="rerank"
+        )
+        self.requests = 0
+        self.budget_exhausted = 0
+        self.pairs_scored = 0
+        self.chunks_dropped = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+    
+    def _score(self, question: str, texts: List[str]) -> List[float]:
+        return self.model.predict(
+            [(question, text) for text in texts],
+            batch_size=self.batch_size,
+            show_progress_bar=False
+        ).tolist()
+    
+    async def rerank(self, question: str, chunks: List[Dict], top_k: int) -> List[Dict]:
+        """
+        Return up to top_k chunks ordered by cross-encoder score.
+        
+        Batches are scored until settings.rerank_budget_ms is spent; chunks
+        left unscored keep their retrieval order behind the scored ones.
+        At least one chunk is always kept.
+        """
+        if not chunks:
+            return []
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        deadline = started + settings.rerank_budget_ms / 1000
+        
+        scored = []
+        position = 0
+        while position < len(chunks) and time.perf_counter() < deadline:
+            batch = chunks[position:position + self.batch_size]
+            scores = await loop.run_in_executor(
+                self._executor, self._score, question, [chunk["text"] for chunk in batch]
+            )
+            scored.extend({**chunk, "rerank_score": score} for chunk, score in zip(batch, scores))
+            position += len(batch)
+        unscored = chunks[position:]
+        
+        scored.sort(key=lambda chunk: chunk["rerank_score"], reverse=True)
+        kept = [chunk for chunk in scored if chunk["rerank_score"] >= settings.rerank_min_score]
+        if not kept and scored:
+            kept = scored[:1]
+        result = (kept + unscored)[:top_k]
+        
+        elapsed = time.perf_counter() - started
+        self.requests += 1
+        self.budget_exhausted += bool(unscored)
+        self.pairs_scored += len(scored)
+        self.chunks_dropped += len(scored) - len(kept)
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+        return result
+    
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "budget_exhausted": self.budget_exhausted,
+            "pairs_scored": self.pairs_scored,
+            "chunks_dropped": self.chunks_dropped,
+            "mean_ms": round(self.total_seconds / self.requests * 1000, 2) if self.requests else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 2)
+        }
@@ -0,0 +1,66 @@
+"""
+Coalescing of identical in-flight calls.
+
+The first caller for a key starts the call as its own task; callers that
+arrive with the same key while it runs wait on that task instead of
+starting another, and all of them get its result or exception. A caller
+that is cancelled only stops waiting; the shared call is cancelled once
+nobody is waiting for it anymore.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Share one in-flight call among concurrent callers with the same key."""
+    
+    def __init__(self):
+        # (operation, key) -> [task, number of callers waiting on it]
+        self._calls: Dict[Tuple[str, Hashable], List] = {}
+        self.calls: Dict[str, int] = {}
+        self.coalesced: Dict[str, int] = {}
+    
+    async def do(self, operation: str, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """Run call(), or join the identical call already running under (operation, key)."""
+        full_key = (operation, key)
+        entry = self._calls.get(full_key)
+        if entry is None:
+            task = asyncio.create_task(call())
+            entry = self._calls[full_key] = [task, 0]
+            task.add_done_callback(lambda done: self._finished(full_key, done))
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        else:
+            self.coalesced[operation] = self.coalesced.get(operation, 0) + 1
+        task = entry[0]
+        
+        entry[1] += 1
+        try:
+            # Shielded, so one caller going away does not cancel it for the rest
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+                # Callers arriving before the task finishes cancelling start a fresh call
+                if self._calls.get(full_key, (None,))[0] is task:
+                    del self._calls[full_key]
+    
+    def _finished(self, full_key, task: asyncio.Task):
+        entry = self._calls.get(full_key)
+        if entry is not None and entry[0] is task:
+            del self._calls[full_key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            task.exception()
+    
+    def stats(self) -> Dict:
+        return {
+            operation: {
+                "calls": self.calls.get(operation, 0),
+                "coalesced": self.coalesced.get(operation, 0)
+            }
+            for operation in sorted(set(self.calls) | set(self.coalesced))
+        }
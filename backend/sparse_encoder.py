@@ -0,0 +1,61 @@
+"""
+Local BM25-style sparse encoder for hybrid retrieval.
+
+Documents get BM25 term-frequency weights; Qdrant applies IDF at query time
+(the sparse vector is configured with Modifier.IDF), so nothing corpus-wide
+has to be kept here. Tokens are hashed into a fixed index space, which
+keeps exact identifiers such as rclpy, URDF or Isaac Sim searchable
+without a vocabulary file. Pure Python, CPU-only, no network.
+"""
+
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+of on or so that the their them then there these this to was we what when where which
+who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def token_index(token: str) -> int:
+    """Stable index for a token (Python's hash() is salted per process)."""
+    return zlib.crc32(token.encode("utf-8")) & 0x7FFFFFFF
+
+
+class BM25SparseEncoder:
+    """Encode documents and queries as sparse (indices, values) pairs."""
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75, avg_doc_tokens: float = 256):
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_tokens = avg_doc_tokens
+    
+    @staticmethod
+    def _merge(weights: Dict[int, float]) -> Tuple[List[int], List[float]]:
+        indices = sorted(weights)
+        return indices, [weights[index] for index in indices]
+    
+    def encode_document(self, text: str) -> Tuple[List[int], List[float]]:
+        """BM25 term-frequency weights for a document."""
+        tokens = tokenize(text)
+        length_norm = 1 - self.b + self.b * len(tokens) / self.avg_doc_tokens
+        weights: Dict[int, float] = {}
+        for token, tf in Counter(tokens).items():
+            index = token_index(token)
+            # Hash collisions just add up
+            weights[index] = weights.get(index, 0.0) + tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+        return self._merge(weights)
+    
+    def encode_query(self, text: str) -> Tuple[List[int], List[float]]:
+        """Query vectors weight each distinct term once; IDF comes from Qdrant."""
+        return self._merge({token_index(token): 1.0 for token in set(tokenize(text))})
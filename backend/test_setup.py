@@ -3,6 +3,7 @@ Quick test script to verify backend setup.
 Run this to check if all services are configured correctly.
 """
 
+import asyncio
 import sys
 from pathlib import Path
 
@@ -88,18 +89,21 @@ def test_qdrant():
     try:
         from qdrant_service import qdrant_service
         
-        # Try to create collection
-        qdrant_service.create_collection()
+        async def run():
+            # Try to create collection
+            await qdrant_service.create_collection()
+            
+            # Test adding a document
+            test_doc = [{
+                "text": "This is a test document",
+                "metadata": {"source": "test"}
+            }]
+            await qdrant_service.add_documents(test_doc)
+            
+            # Test search
+            return await qdrant_service.search("test", limit=1)
         
-        # Test adding a document
-        test_doc = [{
-            "text": "This is a test document",
-            "metadata": {"source": "test"}
-        }]
-        qdrant_service.add_documents(test_doc)
-        
-        # Test search
-        results = qdrant_service.search("test", limit=1)
+        results = asyncio.run(run())
         
         if results:
             print(f"✅ Qdrant working: Found {len(results)} results")
@@ -116,15 +120,18 @@ def test_database():
     """Test database connection."""
     print("\nTesting database connection...")
     try:
+        from sqlalchemy import func, select
         from database import init_db, SessionLocal, User
         
-        # Initialize database
-        init_db()
+        async def run():
+            # Initialize database
+            await init_db()
+            
+            # Test connection
+            async with SessionLocal() as db:
+                return await db.scalar(select(func.count(User.id)))
         
-        # Test connection
-        db = SessionLocal()
-        user_count = db.query(User).count()
-        db.close()
+        user_count = asyncio.run(run())
         
         print(f"✅ Database working: {user_count} users in database")
         return True
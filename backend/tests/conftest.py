@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Settings needs these to import; tests never reach the real services
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("QDRANT_URL", ":memory:")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("AUTH_SECRET", "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
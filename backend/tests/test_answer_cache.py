@@ -0,0 +1,42 @@
+import numpy as np
+
+from answer_cache import SemanticAnswerCache
+
+
+def unit(index, dimension=16):
+    vector = np.zeros(dimension, dtype=np.float32)
+    vector[index] = 1.0
+    return vector.tolist()
+
+
+def test_lookup_finds_entries_after_evictions_move_rows():
+    cache = SemanticAnswerCache(threshold=0.95, ttl_seconds=60, max_entries=10)
+    for index in range(16):
+        cache.store(unit(index), "ns", {"answer": index})
+    
+    # The six oldest were evicted; the rest still map to their own answers
+    for index in range(6):
+        assert cache.lookup(unit(index), "ns") is None
+    for index in range(6, 16):
+        assert cache.lookup(unit(index), "ns") == {"answer": index}
+    assert cache.evictions == 6
+
+
+def test_namespaces_are_separate_and_dropped_when_empty():
+    cache = SemanticAnswerCache(threshold=0.95, ttl_seconds=60, max_entries=2)
+    cache.store(unit(0), "a", {"answer": "a"})
+    cache.store(unit(0), "b", {"answer": "b"})
+    assert cache.lookup(unit(0), "a") == {"answer": "a"}
+    
+    cache.store(unit(1), "c", {"answer": "c"})
+    # "b" was least recently used
+    assert cache.lookup(unit(0), "b") is None
+    assert cache.lookup(unit(0), "a") == {"answer": "a"}
+    assert set(cache._namespaces) == {"a", "c"}
+
+
+def test_expired_entry_is_removed_on_lookup():
+    cache = SemanticAnswerCache(threshold=0.95, ttl_seconds=0, max_entries=10)
+    cache.store(unit(0), "ns", {"answer": 0})
+    assert cache.lookup(unit(0), "ns") is None
+    assert "ns" not in cache._namespaces
@@ -0,0 +1,31 @@
+from chunker import chunk_markdown
+from tokens import count_tokens
+
+
+def assert_within_budget(chunks, max_tokens):
+    assert chunks
+    for chunk in chunks:
+        assert count_tokens(chunk["text"]) <= max_tokens
+
+
+def test_one_long_sentence_is_split_to_the_budget():
+    sentence = " ".join(f"word{i}" for i in range(2000)) + "."
+    chunks = chunk_markdown(f"# Title\n\n{sentence}", max_tokens=100, min_tokens=50)
+    assert_within_budget(chunks, 100)
+    assert "word1999" in chunks[-1]["text"]
+
+
+def test_large_table_is_split_between_rows():
+    rows = "\n".join(f"| joint_{i} | {i * 0.1:.1f} rad | revolute |" for i in range(300))
+    chunks = chunk_markdown(f"| Joint | Limit | Type |\n|---|---|---|\n{rows}", max_tokens=120, min_tokens=60)
+    assert_within_budget(chunks, 120)
+    for chunk in chunks:
+        assert all(line.startswith("|") and line.endswith("|") for line in chunk["text"].split("\n"))
+
+
+def test_long_code_line_is_split_inside_its_fences():
+    code = "```python\nvalues = [" + ", ".join(str(i) for i in range(1500)) + "]\n```"
+    chunks = chunk_markdown(code, max_tokens=150, min_tokens=50)
+    assert_within_budget(chunks, 150)
+    for chunk in chunks:
+        assert chunk["text"].startswith("```python\n") and chunk["text"].endswith("\n```")
@@ -0,0 +1,26 @@
+import asyncio
+
+from config import settings
+from qdrant_service import QdrantService
+
+
+def test_writes_by_another_process_change_the_version(monkeypatch):
+    monkeypatch.setattr(settings, "answer_cache_version_check_seconds", 0)
+    
+    async def main():
+        api = QdrantService()
+        # A second service on the same Qdrant stands in for ingest_content.py
+        ingest = QdrantService()
+        ingest.client = api.client
+        await ingest.create_collection()
+        
+        before = await api.collection_version()
+        unchanged = await api.collection_version()
+        await ingest.set_payload([], {"title": "Nodes"})
+        after = await api.collection_version()
+        await api.close()
+        return before, unchanged, after
+    
+    before, unchanged, after = asyncio.run(main())
+    assert before == unchanged
+    assert after != before
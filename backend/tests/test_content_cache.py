@@ -0,0 +1,67 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from content_cache import ContentVariantCache, content_hash, page_key
+from database import Base, ContentVariant
+
+
+def test_site_urls_and_source_paths_share_a_page_key():
+    assert page_key("/physical-ai-textbook/docs/module1/ros2-fundamentals/") == "module1/ros2-fundamentals"
+    assert page_key("module1/ros2-fundamentals.mdx") == "module1/ros2-fundamentals"
+    assert page_key("/docs/intro?tab=1#setup") == "intro"
+    assert page_key("tutorial/index.md") == "tutorial"
+
+
+def test_content_hash_ignores_line_endings_and_surrounding_whitespace():
+    assert content_hash("# Title\r\n\r\nBody\n") == content_hash("\n# Title\n\nBody")
+    assert content_hash("Body") != content_hash("Edited body")
+
+
+def run_with_db(scenario):
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+        try:
+            return await scenario(sessions)
+        finally:
+            await engine.dispose()
+    
+    return asyncio.run(main())
+
+
+def test_variants_are_only_served_for_the_text_they_were_generated_from():
+    async def scenario(sessions):
+        cache = ContentVariantCache(max_entries=10)
+        calls = []
+        
+        async def generate(text):
+            calls.append(text)
+            return f"rewrite of {text}"
+        
+        async with sessions() as db:
+            first = await cache.get_or_generate(db, "page", "any", "ur", lambda: generate("page"))
+            # Posting other text can't reach the stored variant, whatever the page
+            other = await cache.get_or_generate(db, "injected", "any", "ur", lambda: generate("injected"))
+            again = await cache.get_or_generate(db, "page\n", "any", "ur", lambda: generate("page"))
+        return first, other, again, calls
+    
+    first, other, again, calls = run_with_db(scenario)
+    assert (first, other, again) == ("rewrite of page", "rewrite of injected", "rewrite of page")
+    assert calls == ["page", "injected"]
+
+
+def test_prune_page_drops_variants_of_old_versions():
+    async def scenario(sessions):
+        cache = ContentVariantCache(max_entries=10)
+        async with sessions() as db:
+            await cache.put(db, "old text", "any", "ur", "old", page_path="module1/intro.mdx")
+            await cache.put(db, "new text", "any", "ur", "new", page_path="module1/intro.mdx")
+            await cache.put(db, "user text", "any", "ur", "other")
+            deleted = await cache.prune_page(db, "/docs/module1/intro/", "new text")
+            rows = (await db.execute(ContentVariant.__table__.select())).all()
+        return deleted, sorted(row.content for row in rows)
+    
+    assert run_with_db(scenario) == (1, ["new", "other"])
@@ -0,0 +1,32 @@
+from context_builder import _merge_adjacent
+
+
+def chunk(text, index, score=1.0, source="module1/nodes.md"):
+    return {"text": text, "score": score, "metadata": {"source": source, "chunk_index": index}}
+
+
+def merged(*texts):
+    return [block["text"] for block in _merge_adjacent([chunk(text, i) for i, text in enumerate(texts)])]
+
+
+def test_real_overlap_is_stitched_out():
+    shared = "Each node owns its publishers and subscriptions."
+    assert merged(f"Nodes are processes. {shared}", f"{shared} Topics connect them.") == [
+        f"Nodes are processes. {shared} Topics connect them."
+    ]
+
+
+def test_short_coincidental_overlap_is_kept_with_a_separator():
+    assert merged("Use a node", "every time.") == ["Use a node\n\nevery time."]
+
+
+def test_code_fences_are_not_merged():
+    first = "```bash\nros2 run demo talker\n```"
+    second = "```python\nimport rclpy\n```"
+    assert merged(first, second) == [f"{first}\n\n{second}"]
+
+
+def test_overlap_must_start_at_a_word_boundary():
+    left = "x" * 10 + "ab and the rest of this sentence goes on"
+    right = "b and the rest of this sentence goes on, then more."
+    assert merged(left, right) == [f"{left}\n\n{right}"]
@@ -0,0 +1,37 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import conversation
+from conversation import ConversationMemory
+from database import Base, ChatHistory
+
+
+def test_sessions_are_scoped_to_their_user(monkeypatch, tmp_path):
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'chat.sqlite3'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+        monkeypatch.setattr(conversation, "SessionLocal", sessions)
+        async with sessions() as db:
+            db.add(ChatHistory(user_id=1, session_id="s1", question="my secret", answer="noted"))
+            await db.commit()
+        
+        async def summarize(summary, turns):
+            return summary
+        
+        memory = ConversationMemory(summarize, max_sessions=10)
+        owner = await memory.history("s1", 1)
+        other_user = await memory.history("s1", 2)
+        anonymous = await memory.history("s1", None)
+        memory.append("s1", 2, "hello", "hi")
+        owner_after = await memory.history("s1", 1)
+        await engine.dispose()
+        return owner, other_user, anonymous, owner_after
+    
+    owner, other_user, anonymous, owner_after = asyncio.run(main())
+    assert owner["turns"] == [("my secret", "noted")]
+    assert other_user["turns"] == []
+    assert anonymous["turns"] == []
+    assert owner_after["turns"] == [("my secret", "noted")]
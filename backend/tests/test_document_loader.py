@@ -0,0 +1,34 @@
+from document_loader import strip_mdx
+
+
+def test_inline_code_is_kept_verbatim():
+    text = "Create it with `std::shared_ptr<rclcpp::Node> node` first."
+    assert strip_mdx(text) == text
+
+
+def test_comparisons_in_prose_are_kept():
+    text = "The check passes when x<y and 3 > 2."
+    assert strip_mdx(text) == text
+
+
+def test_template_arguments_in_prose_are_kept():
+    text = "Publish a std::vector<Point> of waypoints."
+    assert strip_mdx(text) == text
+
+
+def test_jsx_and_html_tags_are_removed():
+    text = (
+        "import Tabs from '@theme/Tabs';\n"
+        "\n"
+        "<Tabs groupId=\"os\">\n"
+        "<TabItem value=\"linux\">Run `ros2 run` on <b>Linux</b>.</TabItem>\n"
+        "</Tabs>\n"
+        "<div className=\"note\"><br/>Done</div>\n"
+    )
+    assert strip_mdx(text) == "\n\nRun `ros2 run` on Linux.\n\nDone\n"
+
+
+def test_fenced_code_is_kept_verbatim():
+    text = "<Note>\n```cpp\nauto node = std::make_shared<rclcpp::Node>(\"talker\");\n```\n</Note>\n"
+    assert "std::make_shared<rclcpp::Node>" in strip_mdx(text)
+    assert "<Note>" not in strip_mdx(text)
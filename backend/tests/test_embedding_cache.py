@@ -0,0 +1,27 @@
+from embedding_cache import LRUEmbeddingCache, SQLiteEmbeddingCache, TieredEmbeddingCache
+
+
+def vector(value, dimension=256):
+    return [float(value)] * dimension
+
+
+def test_memory_cache_is_bounded_by_packed_size():
+    # 256 float32 values pack into 1 KB
+    cache = LRUEmbeddingCache(max_bytes=3 * 1024)
+    cache.put_many({"a": vector(1), "b": vector(2), "c": vector(3)})
+    cache.get_many(["a"])
+    cache.put_many({"d": vector(4)})
+    
+    assert cache.get_many(["a", "b", "c", "d"]) == [vector(1), None, vector(3), vector(4)]
+    assert cache.stats()["bytes"] == 3 * 1024
+
+
+def test_cold_items_skip_the_memory_tier(tmp_path):
+    memory = LRUEmbeddingCache(max_bytes=1024 * 1024)
+    cache = TieredEmbeddingCache(memory, SQLiteEmbeddingCache(str(tmp_path / "cache.sqlite3"), 1024 * 1024))
+    cache.put_many({"chunk": vector(1)}, hot=False)
+    
+    assert len(memory) == 0
+    assert cache.get_many(["chunk"]) == [vector(1)]
+    # A query-time hit promotes it
+    assert len(memory) == 1
@@ -0,0 +1,43 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from auth_service import auth_service
+from database import Base, User
+from profile_cache import ProfileCache
+
+
+def test_tokens_from_before_a_profile_update_get_the_new_profile(tmp_path):
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'users.sqlite3'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+        # Two API processes, each with its own cache
+        here, elsewhere = ProfileCache(ttl_seconds=300, max_entries=10), ProfileCache(ttl_seconds=300, max_entries=10)
+        
+        async with sessions() as db:
+            db.add(User(email="a@example.com", name="A", password_hash="x",
+                        software_experience="beginner", hardware_experience="beginner"))
+            await db.commit()
+            old = auth_service.verify_token(auth_service.create_access_token(await db.get(User, 1)))
+            await elsewhere.load(db, 1, old["profile_version"])
+            
+            user = await auth_service.update_profile(db, 1, software_experience="advanced")
+            here.put(user)
+            new = auth_service.verify_token(auth_service.create_access_token(user))
+            
+            old_here = await here.load(db, 1, old["profile_version"])
+            new_elsewhere = await elsewhere.load(db, 1, new["profile_version"])
+            # Once the cache expires, the old token still doesn't bring back its claims
+            here._entries.clear()
+            old_after_expiry = await here.load(db, 1, old["profile_version"])
+        await engine.dispose()
+        return old, new, old_here, new_elsewhere, old_after_expiry
+    
+    old, new, old_here, new_elsewhere, old_after_expiry = asyncio.run(main())
+    assert old["software_experience"] == "beginner"
+    assert new["profile_version"] == old["profile_version"] + 1
+    assert old_here["software_experience"] == "advanced"
+    assert new_elsewhere["software_experience"] == "advanced"
+    assert old_after_expiry["software_experience"] == "advanced"
@@ -0,0 +1,83 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def main():
+        inflight = SingleFlight()
+        calls = []
+        
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "done"
+        
+        results = await asyncio.gather(*(inflight.do("op", "key", work) for _ in range(5)))
+        return results, calls, inflight.stats()
+    
+    results, calls, stats = asyncio.run(main())
+    assert results == ["done"] * 5
+    assert len(calls) == 1
+    assert stats == {"op": {"calls": 1, "coalesced": 4}}
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def main():
+        inflight = SingleFlight()
+        
+        async def work():
+            await asyncio.sleep(0.02)
+            return "done"
+        
+        first = asyncio.create_task(inflight.do("op", "key", work))
+        second = asyncio.create_task(inflight.do("op", "key", work))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        return first, await second
+    
+    first, result = asyncio.run(main())
+    assert first.cancelled()
+    assert result == "done"
+
+
+def test_caller_arriving_while_abandoned_call_cancels_starts_fresh():
+    async def main():
+        inflight = SingleFlight()
+        calls = []
+        
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return "done"
+        
+        first = asyncio.create_task(inflight.do("op", "key", work))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        # Let the last waiter leave and cancel the shared task, but not the
+        # task's done-callback that would normally drop the entry
+        await asyncio.sleep(0)
+        result = await inflight.do("op", "key", work)
+        return first, result, calls, inflight._calls
+    
+    first, result, calls, pending = asyncio.run(main())
+    assert first.cancelled()
+    assert result == "done"
+    assert len(calls) == 2
+    assert pending == {}
+
+
+def test_exception_reaches_every_caller():
+    async def main():
+        inflight = SingleFlight()
+        
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+        
+        return await asyncio.gather(
+            *(inflight.do("op", "key", work) for _ in range(3)), return_exceptions=True
+        )
+    
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
@@ -0,0 +1,50 @@
+"""
+Token counting helpers shared by ingestion and prompt building.
+"""
+
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+
+from config import settings
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """Return the tiktoken encoding for a model, or None if unavailable."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # tiktoken downloads its BPE files on first use; stay usable offline.
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count tokens in text, falling back to a 4-chars-per-token estimate."""
+    encoding = get_encoding(model or settings.openai_model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Cut text down to at most max_tokens tokens."""
+    encoding = get_encoding(model or settings.openai_model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def split_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """Cut text into consecutive pieces of at most max_tokens tokens."""
+    encoding = get_encoding(model or settings.openai_model)
+    if encoding is None:
+        return [text[start:start + max_tokens * 4] for start in range(0, len(text), max_tokens * 4)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[start:start + max_tokens]) for start in range(0, len(tokens), max_tokens)]
@@ -0,0 +1,302 @@
+"""
+Shared scheduling of calls to the OpenAI API.
+
+Every completion and embeddings request waits here for a slot. Waiters are
+served by priority (interactive chat before bulk personalize, translate
+and ingest work), then in arrival order, and only while the
+requests-per-minute and tokens-per-minute budgets have room and fewer
+calls are in flight than the current concurrency limit. The limit adapts
+AIMD-style: it grows by about one for every limit's worth of healthy calls,
+halves on a 429 and shrinks slightly when calls get much slower than usual.
+Rate-limit, timeout, connection and 5xx errors are retried with jittered
+exponential backoff. A call that cannot get a slot before its priority's
+deadline fails with UpstreamBusy, which the API turns into a 503.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import openai
+
+from config import settings
+from metrics import STAGE_SECONDS
+from tokens import count_tokens
+
+T = TypeVar("T")
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+# Priority of upstream calls that don't pass one explicitly (embeddings)
+call_priority: ContextVar[int] = ContextVar("call_priority", default=INTERACTIVE)
+
+RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+THROTTLED_DECREASE = 0.5  # limit factor after a 429
+SLOW_DECREASE = 0.9  # limit factor after a slow call, timeout or 5xx
+DECREASE_INTERVAL = 1.0  # seconds; calls already in flight report the same overload
+
+
+class UpstreamBusy(Exception):
+    """No upstream slot became free before the call's deadline."""
+    
+    def __init__(self, retry_after: float):
+        super().__init__("Too many requests to the language model, please retry shortly")
+        self.retry_after = retry_after
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: Optional[int]) -> int:
+    """Tokens a completion may use: the prompt plus the most it can generate."""
+    prompt = sum(count_tokens(message["content"]) for message in messages)
+    return prompt + (max_tokens or 0)
+
+
+def _retry_after(error: Exception) -> float:
+    """Seconds the server asked us to wait, or 0."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return 0.0
+    try:
+        if "retry-after-ms" in response.headers:
+            return float(response.headers["retry-after-ms"]) / 1000
+        return float(response.headers.get("retry-after", 0))
+    except ValueError:
+        return 0.0
+
+
+class TokenBucket:
+    """Budget refilled continuously at `per_minute` units per minute; 0 means unlimited."""
+    
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+    
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available."""
+        if not self.capacity:
+            return 0.0
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+        # A single call larger than the whole budget waits for a full bucket
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+    
+    def take(self, amount: float):
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+    
+    def give_back(self, amount: float):
+        """Return (or, if negative, take more of) the budget after an estimate."""
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class UpstreamScheduler:
+    """Priority queue, rate budgets and adaptive concurrency for one upstream model."""
+    
+    def __init__(self, name: str, requests_per_minute: int, tokens_per_minute: int):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.limit = float(settings.upstream_initial_concurrency)
+        self.in_flight = 0
+        # Heap of (priority, arrival, future, tokens); abandoned futures are skipped
+        self._queue: List = []
+        self._arrivals = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._paused_until = 0.0  # from Retry-After on 429s
+        self._last_decrease = 0.0
+        # operation -> moving average of healthy latency
+        self._latency: Dict[str, float] = {}
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.slow = 0
+        self.shed = {name: 0 for name in PRIORITY_NAMES.values()}
+    
+    def deadline(self, priority: int) -> float:
+        if priority == INTERACTIVE:
+            return settings.upstream_interactive_deadline
+        return settings.upstream_bulk_deadline
+    
+    def queued(self) -> Dict[str, int]:
+        counts = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future, _ in self._queue:
+            if not future.done():
+                counts[PRIORITY_NAMES[priority]] += 1
+        return counts
+    
+    def _dispatch(self):
+        """Grant slots to waiters in priority order while concurrency and budgets allow."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        while self._queue:
+            priority, _, future, tokens = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            if self.in_flight >= int(self.limit):
+                # The next release dispatches again
+                return
+            wait = max(
+                self._paused_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(tokens, now)
+            )
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            future.set_result(None)
+    
+    async def _acquire(self, priority: int, tokens: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._arrivals), future, tokens))
+        self._dispatch()
+        if future.done():
+            return
+        
+        started = time.perf_counter()
+        try:
+            # Shielded so a timeout leaves the future for us to inspect below
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.deadline(priority))
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # Granted just as we gave up: hand the slot on
+                self._release()
+            future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed[PRIORITY_NAMES[priority]] += 1
+                raise UpstreamBusy(max(1.0, self._paused_until - time.monotonic())) from None
+            raise
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="upstream_queue")
+    
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+    
+    def _decrease(self, factor: float):
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_INTERVAL:
+            return
+        self._last_decrease = now
+        self.limit = max(float(settings.upstream_min_concurrency), self.limit * factor)
+    
+    def _on_success(self, operation: str, latency: float):
+        usual = self._latency.get(operation)
+        self._latency[operation] = latency if usual is None else 0.9 * usual + 0.1 * latency
+        if usual is not None and latency > usual * settings.upstream_latency_tolerance:
+            self.slow += 1
+            self._decrease(SLOW_DECREASE)
+        elif self.in_flight >= self.limit / 2:
+            # Only grow a limit that is actually being used
+            self.limit = min(float(settings.upstream_max_concurrency), self.limit + 1 / self.limit)
+    
+    def _on_error(self, error: Exception):
+        if isinstance(error, openai.RateLimitError):
+            self.throttled += 1
+            retry_after = _retry_after(error)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._decrease(THROTTLED_DECREASE)
+        else:
+            self._decrease(SLOW_DECREASE)
+    
+    async def _start(
+        self,
+        operation: str,
+        request: Callable[[], Awaitable[T]],
+        tokens: int,
+        priority: Optional[int]
+    ) -> T:
+        """Make the request, retrying transient failures. On success the caller holds a slot."""
+        if priority is None:
+            priority = call_priority.get()
+        for attempt in itertools.count():
+            await self._acquire(priority, tokens)
+            started = time.monotonic()
+            try:
+                result = await request()
+            except RETRYABLE as e:
+                self._on_error(e)
+                self._release()
+                # An exhausted quota won't come back by retrying
+                if attempt >= settings.upstream_max_retries or getattr(e, "code", None) == "insufficient_quota":
+                    raise
+                self.retries += 1
+                backoff = min(settings.upstream_retry_max_delay, settings.upstream_retry_base_delay * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, backoff))
+                continue
+            except BaseException:
+                self._release()
+                raise
+            self.calls += 1
+            self._on_success(operation, time.monotonic() - started)
+            return result
+    
+    async def call(
+        self,
+        operation: str,
+        request: Callable[[], Awaitable[T]],
+        tokens: int = 0,
+        priority: Optional[int] = None
+    ) -> T:
+        """Run request() once a slot is free, retrying transient failures."""
+        result = await self._start(operation, request, tokens, priority)
+        self._release()
+        self.reconcile(tokens, getattr(result, "usage", None))
+        return result
+    
+    @asynccontextmanager
+    async def stream(
+        self,
+        operation: str,
+        request: Callable[[], Awaitable[T]],
+        tokens: int = 0,
+        priority: Optional[int] = None
+    ) -> AsyncIterator[T]:
+        """Open a streamed response like call(), holding its slot until the block exits."""
+        result = await self._start(operation, request, tokens, priority)
+        try:
+            yield result
+        finally:
+            self._release()
+    
+    def reconcile(self, estimated: int, usage):
+        """Correct the token budget once a response reports what it actually used."""
+        total_tokens = getattr(usage, "total_tokens", None)
+        if total_tokens is not None:
+            self.tokens.give_back(estimated - total_tokens)
+    
+    def stats(self) -> Dict:
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": self.queued(),
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "slow": self.slow,
+            "shed": dict(self.shed),
+            "paused_seconds": round(max(0.0, self._paused_until - time.monotonic()), 2)
+        }
+
+
+chat_upstream = UpstreamScheduler("chat", settings.upstream_rpm, settings.upstream_tpm)
+embedding_upstream = UpstreamScheduler(
+    "embedding", settings.upstream_embedding_rpm, settings.upstream_embedding_tpm
+)
@@ -1,5 +1,5 @@
 import React, { useState, useRef, useEffect } from 'react';
-import { chatAPI } from '../../utils/api';
+import { chatAPI, ChatStreamError } from '../../utils/api';
 import styles from './Chatbot.module.css';
 
 export default function Chatbot(): JSX.Element {
@@ -10,6 +10,7 @@ export default function Chatbot(): JSX.Element {
     const [input, setInput] = useState('');
     const [loading, setLoading] = useState(false);
     const messagesEndRef = useRef<HTMLDivElement>(null);
+    const sessionIdRef = useRef<string | undefined>(undefined);
 
     const scrollToBottom = () => {
         messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -27,18 +28,40 @@ export default function Chatbot(): JSX.Element {
         setMessages(prev => [...prev, { role: 'user', content: userMessage }]);
         setLoading(true);
 
-        try {
-            const response = await chatAPI.sendMessage({
-                question: userMessage,
-                selected_text: '',
+        let streamStarted = false;
+        const appendToken = (token: string) => {
+            if (!streamStarted) {
+                // First token: replace the typing indicator with the streamed message
+                streamStarted = true;
+                setLoading(false);
+                setMessages(prev => [...prev, { role: 'assistant', content: token }]);
+                return;
+            }
+            setMessages(prev => {
+                const last = prev[prev.length - 1];
+                return [...prev.slice(0, -1), { ...last, content: last.content + token }];
             });
+        };
 
-            setMessages(prev => [...prev, { role: 'assistant', content: response.answer }]);
+        try {
+            await chatAPI.streamMessage(
+                {
+                    question: userMessage,
+                    selected_text: '',
+                    session_id: sessionIdRef.current,
+                },
+                {
+                    onToken: appendToken,
+                    onSession: (sessionId) => { sessionIdRef.current = sessionId; },
+                }
+            );
         } catch (error: any) {
             console.error('Chat error:', error);
             setMessages(prev => [...prev, {
                 role: 'assistant',
-                content: 'Sorry, I encountered an error. Please make sure the backend server is running on port 8000.'
+                content: error instanceof ChatStreamError
+                    ? error.message
+                    : 'Sorry, I encountered an error. Please make sure the backend server is running on port 8000.'
             }]);
         } finally {
             setLoading(false);
@@ -55,8 +55,32 @@ export const authAPI = {
     const response = await api.get('/api/auth/me');
     return response.data;
   },
+
+  // The profile travels inside the token, so keep the reissued one
+  updateProfile: async (data: {
+    name?: string;
+    software_experience?: string;
+    hardware_experience?: string;
+  }) => {
+    const response = await api.put('/api/auth/profile', data);
+    if (response.data.token && typeof window !== 'undefined') {
+      localStorage.setItem('auth_token', response.data.token);
+    }
+    return response.data;
+  },
 };
 
+// Raised when the backend reports an error inside the chat stream (e.g. the model is overloaded)
+export class ChatStreamError extends Error {
+  retryAfter?: number;
+
+  constructor(message: string, retryAfter?: number) {
+    super(message);
+    this.name = 'ChatStreamError';
+    this.retryAfter = retryAfter;
+  }
+}
+
 // Chat API
 export const chatAPI = {
   sendMessage: async (data: {
@@ -67,6 +91,91 @@ export const chatAPI = {
     const response = await api.post('/api/chat', data);
     return response.data;
   },
+
+  // Stream an answer over server-sent events. Calls onToken for each chunk
+  // and resolves with the full answer once the stream ends.
+  streamMessage: async (
+    data: {
+      question: string;
+      selected_text?: string;
+      session_id?: string;
+    },
+    handlers: {
+      onToken: (token: string) => void;
+      onSources?: (sources: any[]) => void;
+      onSession?: (sessionId: string) => void;
+    },
+    signal?: AbortSignal
+  ): Promise<string> => {
+    const token = typeof window !== 'undefined' ? localStorage.getItem('auth_token') : null;
+    const response = await fetch(`${API_URL}/api/chat/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      body: JSON.stringify(data),
+      signal,
+    });
+    if (response.status === 503) {
+      // Overloaded before the stream started
+      const body = await response.json().catch(() => ({}));
+      throw new ChatStreamError(
+        body.detail || 'The assistant is busy, please retry shortly',
+        Number(response.headers.get('Retry-After')) || undefined
+      );
+    }
+    if (!response.ok || !response.body) {
+      throw new Error(`Chat stream failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let answer = '';
+    let finished = false;
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        let event = 'message';
+        let payload = '';
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) payload += line.slice(6);
+        }
+        if (!payload) continue;
+        const parsed = JSON.parse(payload);
+
+        if (event === 'token') {
+          answer += parsed.content;
+          handlers.onToken(parsed.content);
+        } else if (event === 'sources') {
+          handlers.onSources?.(parsed.sources);
+        } else if (event === 'session') {
+          handlers.onSession?.(parsed.session_id);
+        } else if (event === 'done') {
+          finished = true;
+        } else if (event === 'error') {
+          await reader.cancel();
+          throw new ChatStreamError(parsed.detail, parsed.retry_after);
+        }
+      }
+    }
+
+    if (!finished) {
+      throw new ChatStreamError('The answer was interrupted, please try again');
+    }
+    return answer;
+  },
 };
 
 // Content API